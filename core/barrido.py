@@ -0,0 +1,149 @@
+"""
+Barrido de parámetros: día × hora × número de cajas × mapa (o cualquier clave del escenario).
+
+Cada celda de la grilla es un escenario con sus réplicas. Todas las réplicas
+pendientes se reparten en un mismo ProcessPoolExecutor y cada celda se guarda
+en un almacén SQLite indexado apenas termina, así que al relanzar el barrido
+las celdas ya calculadas se omiten.
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from core.escenario import normalizar_escenario, construir_mapa
+from entities.cell import CellType
+from core.replicas import ejecutar_replica, resumir_replicas, semillas_replicas
+
+ALMACEN_DEFAULT = "resultados_barrido.sqlite"
+# columnas indexadas por las que se puede consultar el almacén
+COLUMNAS_FILTRO = ("day", "hour", "checkouts", "map_file")
+
+
+def _dimensiones_mapa(escenario: dict, cache: dict) -> dict:
+    """rows, cols y checkouts reales del map_file (construir_mapa ignora los del escenario)."""
+    ruta = escenario["map_file"]
+    if ruta not in cache:
+        sm = construir_mapa(escenario)
+        cache[ruta] = {"rows": sm.rows, "cols": sm.cols,
+                       "checkouts": sum(c.type == CellType.CHECKOUT for fila in sm.grid for c in fila)}
+    return cache[ruta]
+
+
+def expandir_grilla(grilla: Dict[str, list], base: Optional[dict] = None) -> List[dict]:
+    """
+    Producto cartesiano de la grilla, p.ej. {"day": [...], "hour": [...], "checkouts": [...], "map_file": [...]}.
+    Con map_file, rows, cols y checkouts se reemplazan por los del mapa, así
+    que las combinaciones que solo difieren en ellos son la misma celda y
+    aparecen una vez.
+    """
+    claves = list(grilla.keys())
+    escenarios, vistos, mapas = [], set(), {}
+    for valores in itertools.product(*(grilla[k] for k in claves)):
+        escenario = dict(base or {})
+        escenario.update(zip(claves, valores))
+        escenario = normalizar_escenario(escenario)
+        if escenario.get("map_file"):
+            escenario.update(_dimensiones_mapa(escenario, mapas))
+        clave = json.dumps(escenario, sort_keys=True, ensure_ascii=False)
+        if clave not in vistos:
+            vistos.add(clave)
+            escenarios.append(escenario)
+    return escenarios
+
+
+def clave_celda(escenario: dict, replicas: int, semilla: Optional[int]) -> str:
+    """Clave canónica de una celda del barrido."""
+    return json.dumps({"escenario": escenario, "replicas": replicas, "semilla": semilla, "flujos": True},
+                      sort_keys=True, ensure_ascii=False)
+
+
+class AlmacenResultados:
+    """
+    Almacén de resultados del barrido en SQLite, indexado por día, hora, cajas y mapa.
+    """
+
+    def __init__(self, path: str = ALMACEN_DEFAULT):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                clave TEXT PRIMARY KEY,
+                day TEXT, hour INTEGER, checkouts INTEGER, map_file TEXT,
+                replicas INTEGER, semilla INTEGER,
+                escenario TEXT, kpis TEXT, creado TEXT
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_resultados_celda "
+                          "ON resultados (day, hour, checkouts, map_file)")
+        self.conn.commit()
+
+    def contiene(self, clave: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM resultados WHERE clave = ?", (clave,)).fetchone() is not None
+
+    def guardar(self, clave: str, escenario: dict, replicas: int, semilla: Optional[int], kpis: dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (clave, escenario["day"], escenario["hour"], escenario["checkouts"], escenario["map_file"],
+             replicas, semilla,
+             json.dumps(escenario, ensure_ascii=False), json.dumps(kpis),
+             datetime.now().isoformat(timespec="seconds")))
+        self.conn.commit()
+
+    def consultar(self, **filtros) -> List[dict]:
+        """
+        Filas del almacén que coinciden con los filtros (day, hour, checkouts,
+        map_file); un filtro None busca los valores nulos.
+        """
+        desconocidas = set(filtros) - set(COLUMNAS_FILTRO)
+        if desconocidas:
+            raise ValueError(f"Filtros no soportados: {sorted(desconocidas)} (usar {COLUMNAS_FILTRO})")
+        where = " AND ".join(f"{k} IS NULL" if v is None else f"{k} = ?" for k, v in filtros.items())
+        parametros = tuple(v for v in filtros.values() if v is not None)
+        sql = "SELECT escenario, replicas, semilla, kpis FROM resultados" + (f" WHERE {where}" if where else "")
+        return [{"escenario": json.loads(e), "replicas": r, "semilla": s, "kpis": json.loads(k)}
+                for e, r, s, k in self.conn.execute(sql, parametros)]
+
+    def close(self):
+        self.conn.close()
+
+
+def ejecutar_barrido(grilla: Dict[str, list], base: Optional[dict] = None, replicas: int = 10,
+                     semilla: Optional[int] = None, workers: Optional[int] = None,
+                     almacen: str = ALMACEN_DEFAULT) -> dict:
+    """
+    Ejecuta todas las celdas pendientes del barrido y las guarda en el almacén.
+    Retorna cuántas celdas se calcularon y cuántas se omitieron por estar listas.
+    """
+    store = AlmacenResultados(almacen)
+    pendientes = []
+    omitidas = 0
+    for escenario in expandir_grilla(grilla, base):
+        clave = clave_celda(escenario, replicas, semilla)
+        if store.contiene(clave):
+            omitidas += 1
+        else:
+            pendientes.append((clave, escenario))
+
+    # mismas semillas en cada celda y flujos dedicados por fuente de aleatoriedad
+    # (core.flujos): números aleatorios comunes entre celdas aunque cambie el orden de los eventos
+    semillas = semillas_replicas(semilla, replicas)
+    resultados: Dict[str, list] = {clave: [] for clave, _ in pendientes}
+    escenarios = dict(pendientes)
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+            futuros = {ex.submit(ejecutar_replica, escenario, s, False): clave
+                       for clave, escenario in pendientes for s in semillas}
+            for futuro in as_completed(futuros):
+                clave = futuros[futuro]
+                resultados[clave].append(futuro.result())
+                if len(resultados[clave]) == replicas:
+                    store.guardar(clave, escenarios[clave], replicas, semilla,
+                                  resumir_replicas(resultados[clave]))
+    finally:
+        store.close()
+
+    return {"calculadas": len(pendientes), "omitidas": omitidas, "almacen": almacen}
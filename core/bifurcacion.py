@@ -0,0 +1,111 @@
+"""
+Bifurcación de una simulación en curso en K variantes ("¿y si abrimos otra caja ahora?").
+
+Las variantes corren en procesos worker. Donde existe `fork`, los workers
+heredan la simulación base por copy-on-write (no se serializa nada); en otras
+plataformas reciben un snapshot una sola vez al iniciar. Dentro del worker
+cada variante copia solo el estado mutable (celdas, clientes, timers,
+métricas) y comparte las estructuras inmutables (catálogo de productos y
+configuración de símbolos).
+
+Una variante es un dict:
+    {"nombre": "3 cajas", "abrir_cajas": [(9, 9)], "ticks": 300, "funcion": f}
+donde `funcion` (opcional, función de módulo) recibe la simulación copiada
+para aplicar cambios arbitrarios.
+"""
+
+import copy
+import multiprocessing
+import os
+import random
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from core.simulation import Simulation
+from core.escenario import metricas_simulacion
+from core.snapshot import snapshot_bytes, restaurar_bytes
+from entities.cell import CellType
+
+# simulación base en el worker (heredada por fork o restaurada del snapshot)
+_BASE: Optional[Simulation] = None
+_RNG_BASE = None
+
+
+def _estructuras_compartidas(sim: Simulation) -> list:
+    """Objetos que no cambian durante la simulación y pueden compartirse entre copias."""
+    compartidas = [sim.map.symbol_config]
+    # tabla de distancias desde las cajas (aplicar_variante la descarta si abre cajas)
+    for nombre in ("posiciones_cajas", "distancias_cajas", "_indice_cajas"):
+        tabla = getattr(sim.map, nombre, None)
+        if tabla is not None:
+            compartidas.append(tabla)
+    productos = getattr(sim.client_factory, "products", None)
+    if productos is not None:
+        compartidas.append(productos)
+    return compartidas
+
+
+def copiar_estado(sim: Simulation) -> Simulation:
+    """Copia profunda del estado mutable, compartiendo las estructuras inmutables."""
+    memo = {id(obj): obj for obj in _estructuras_compartidas(sim)}
+    return copy.deepcopy(sim, memo)
+
+
+def aplicar_variante(sim: Simulation, variante: dict):
+    """Aplica los cambios de una variante a la simulación."""
+    for pos in variante.get("abrir_cajas", []):
+        cell = sim.map.get_cell(*pos)
+        if cell is None or cell.type != CellType.AISLE or cell.clients:
+            raise ValueError(f"No se puede abrir una caja en {pos}: la celda debe ser un pasillo vacío")
+        cell.type = CellType.CHECKOUT
+    funcion = variante.get("funcion")
+    if funcion is not None:
+        funcion(sim)
+    if variante.get("abrir_cajas") or funcion is not None:
+        # la función puede haber cambiado las cajas también
+        sim.map.invalidate_checkout_distances()
+
+
+def _inicializar_worker(data: Optional[bytes]):
+    global _BASE, _RNG_BASE
+    if data is not None:
+        _BASE = restaurar_bytes(data)
+    _RNG_BASE = (random.getstate(), np.random.get_state())
+
+
+def _correr_variante(variante: dict, ticks: int) -> dict:
+    # todas las variantes parten del mismo estado de los RNG globales
+    random.setstate(_RNG_BASE[0])
+    np.random.set_state(_RNG_BASE[1])
+    sim = copiar_estado(_BASE)
+    aplicar_variante(sim, variante)
+    inicio = sim.tick
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        sim.advance(variante.get("ticks", ticks))
+    resultado = {"nombre": variante.get("nombre"), "desde_tick": inicio}
+    resultado.update(metricas_simulacion(sim))
+    return resultado
+
+
+def bifurcar(sim: Simulation, variantes: List[dict], ticks: int, workers: Optional[int] = None) -> List[dict]:
+    """
+    Corre cada variante desde el estado actual de `sim` durante `ticks` ticks,
+    en paralelo, y retorna sus KPIs. `sim` no se modifica.
+    """
+    global _BASE
+    workers = min(workers or os.cpu_count(), len(variantes)) or 1
+    if "fork" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("fork")
+        _BASE, data = sim, None  # heredada copy-on-write por los workers
+    else:
+        contexto = None
+        data = snapshot_bytes(sim)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto,
+                                 initializer=_inicializar_worker, initargs=(data,)) as ex:
+            return list(ex.map(_correr_variante, variantes, [ticks] * len(variantes)))
+    finally:
+        _BASE = None
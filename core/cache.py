@@ -0,0 +1,203 @@
+"""
+Caché en disco de resultados de escenarios, direccionada por contenido.
+
+La clave es un SHA-256 del escenario canónico (normalizado, JSON con claves
+ordenadas; un map_file entra por el hash de su contenido, no por su ruta),
+la semilla, el número de réplicas, la versión del código (hash de las
+fuentes de la simulación) y los datos que la simulación lee del directorio
+de trabajo: los parámetros de distribuciones efectivamente cargados (tras una
+recalibración con core/calibracion.py) y el symbol_map.json. Así un cambio en
+el modelo o en sus parámetros invalida la caché sin tener que borrarla a
+mano. Sin semilla la corrida no es reproducible y no se cachea.
+
+Cada entrada es un directorio con resultado.json y, opcionalmente, las
+gráficas (graficas/...). El tamaño total se acota con desalojo LRU: cada
+lectura actualiza el mtime de la entrada y al guardar se borran las menos
+usadas hasta quedar bajo max_bytes.
+
+El directorio y el límite por defecto se pueden cambiar con SIM_CACHE_DIR y
+SIM_CACHE_MB.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from core import distribuciones
+from core.escenario import normalizar_escenario
+
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# fuentes que determinan el resultado de una corrida
+FUENTES_MODELO = ("core", "entities", "pathfinding.py", "analytics.py")
+# leído por StoreMap desde el directorio de trabajo
+SYMBOL_MAP_FILE = "symbol_map.json"
+
+_version_codigo: Optional[str] = None
+
+
+def version_codigo() -> str:
+    """Hash de las fuentes del modelo (se calcula una vez por proceso)."""
+    global _version_codigo
+    if _version_codigo is None:
+        h = hashlib.sha256()
+        for fuente in FUENTES_MODELO:
+            ruta = os.path.join(RAIZ_PROYECTO, fuente)
+            if os.path.isdir(ruta):
+                archivos = sorted(os.path.join(raiz, n) for raiz, _, nombres in os.walk(ruta)
+                                  for n in nombres if n.endswith(".py"))
+            else:
+                archivos = [ruta] if os.path.exists(ruta) else []
+            for archivo in archivos:
+                h.update(os.path.relpath(archivo, RAIZ_PROYECTO).encode())
+                with open(archivo, "rb") as f:
+                    h.update(f.read())
+        _version_codigo = h.hexdigest()[:16]
+    return _version_codigo
+
+
+def version_parametros() -> str:
+    """
+    Hash de los parámetros de distribuciones (los cargados en memoria y el
+    archivo, que leen los workers que arrancan después) y del mapa de
+    símbolos. Se calcula en cada llamada: una recalibración los cambia sin
+    reiniciar el proceso.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(distribuciones.PARAMETROS, sort_keys=True, ensure_ascii=True).encode())
+    for archivo in (distribuciones.PARAMETROS_FILE, SYMBOL_MAP_FILE):
+        h.update(archivo.encode())
+        if os.path.exists(archivo):
+            h.update(_hash_archivo(archivo).encode())
+    return h.hexdigest()[:16]
+
+
+def _hash_archivo(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 16), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def clave_escenario(escenario: dict, semilla: Optional[int], replicas: int = 1,
+                    graficas: bool = False) -> Optional[str]:
+    """Clave de caché del escenario, o None si no es cacheable (sin semilla)."""
+    if semilla is None:
+        return None
+    canonico = normalizar_escenario(escenario)
+    if canonico.get("map_file"):
+        canonico["map_file"] = "sha256:" + _hash_archivo(canonico["map_file"])
+    contenido = {
+        "escenario": canonico,
+        "semilla": semilla,
+        "replicas": replicas,
+        "graficas": graficas,
+        "version": version_codigo(),
+        "parametros": version_parametros(),
+    }
+    texto = json.dumps(contenido, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def _tamano(directorio: str) -> int:
+    return sum(os.path.getsize(os.path.join(raiz, n)) for raiz, _, nombres in os.walk(directorio) for n in nombres)
+
+
+class CacheResultados:
+    """Entradas resultado.json (+ gráficas) por clave, con desalojo LRU por tamaño."""
+
+    def __init__(self, directorio: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directorio = directorio or os.environ.get("SIM_CACHE_DIR") or os.path.join(RAIZ_PROYECTO, "cache_resultados")
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("SIM_CACHE_MB", 512)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave[:2], clave)
+
+    def obtener(self, clave: Optional[str]) -> Optional[dict]:
+        """Resultado cacheado (marcándolo como recién usado) o None."""
+        if clave is None:
+            return None
+        ruta = self.ruta(clave)
+        try:
+            with open(os.path.join(ruta, "resultado.json"), "r", encoding="utf-8") as f:
+                resultado = json.load(f)
+            os.utime(ruta)
+        except (OSError, ValueError):
+            return None
+        return resultado
+
+    def graficas(self, clave: str) -> List[str]:
+        """Rutas absolutas de las gráficas guardadas con la entrada."""
+        base = os.path.join(self.ruta(clave), "graficas")
+        return sorted(os.path.join(raiz, n) for raiz, _, nombres in os.walk(base)
+                      for n in nombres if n.endswith(".png"))
+
+    def guardar(self, clave: Optional[str], resultado: dict, graficas: Optional[str] = None) -> Optional[str]:
+        """
+        Guarda el resultado (y el directorio de gráficas, que se mueve a la
+        entrada) y recorta la caché. Retorna la ruta de la entrada.
+        """
+        if clave is None:
+            return None
+        destino = self.ruta(clave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # se arma en un directorio temporal y se renombra: un lector nunca ve una entrada a medias
+        tmp = tempfile.mkdtemp(prefix=".tmp_", dir=self.directorio)
+        try:
+            with open(os.path.join(tmp, "resultado.json"), "w", encoding="utf-8") as f:
+                json.dump(resultado, f, ensure_ascii=False)
+            if graficas is not None and os.path.isdir(graficas):
+                shutil.move(graficas, os.path.join(tmp, "graficas"))
+            try:
+                os.rename(tmp, destino)
+            except OSError:
+                # otra corrida guardó la misma clave primero: el contenido es equivalente
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.recortar()
+        return destino
+
+    def directorio_temporal(self) -> str:
+        """Directorio de trabajo dentro de la caché (mismo disco, se mueve sin copiar)."""
+        return tempfile.mkdtemp(prefix=".tmp_", dir=self.directorio)
+
+    def entradas(self) -> List[dict]:
+        salida = []
+        for prefijo in os.listdir(self.directorio):
+            base = os.path.join(self.directorio, prefijo)
+            if prefijo.startswith(".") or not os.path.isdir(base):
+                continue
+            for clave in os.listdir(base):
+                ruta = os.path.join(base, clave)
+                try:
+                    salida.append({"clave": clave, "usado": os.path.getmtime(ruta), "bytes": _tamano(ruta)})
+                except OSError:
+                    continue
+        return salida
+
+    def recortar(self):
+        """Desaloja las entradas menos usadas hasta quedar bajo max_bytes."""
+        with self._lock:
+            entradas = sorted(self.entradas(), key=lambda e: e["usado"])
+            total = sum(e["bytes"] for e in entradas)
+            while entradas and total > self.max_bytes:
+                e = entradas.pop(0)
+                shutil.rmtree(self.ruta(e["clave"]), ignore_errors=True)
+                total -= e["bytes"]
+            # temporales huérfanos de procesos que murieron a medio guardar
+            limite = time.time() - 3600
+            for nombre in os.listdir(self.directorio):
+                ruta = os.path.join(self.directorio, nombre)
+                if nombre.startswith(".tmp_") and os.path.getmtime(ruta) < limite:
+                    shutil.rmtree(ruta, ignore_errors=True)
@@ -0,0 +1,104 @@
+"""
+Detección del período de calentamiento (warm-up) y truncamiento del transitorio.
+
+Cada corrida empieza con la tienda vacía, lo que sesga los promedios de
+longitud de cola y utilización. Aquí se estima el punto de truncamiento
+con MSER-5 sobre esas series y se descartan los ticks transitorios, o bien
+se calienta una simulación una vez y se reanudan copias desde ese estado.
+"""
+
+import copy
+from typing import Dict, Optional
+
+import numpy as np
+
+from core.simulation import Simulation
+
+
+def mser(serie, lote: int = 5, max_fraccion: float = 0.5) -> int:
+    """
+    Punto de truncamiento MSER-m (m = lote) de una serie.
+
+    Se agrupa la serie en medias de lotes de tamaño `lote` y se elige el número
+    de lotes d que minimiza var(medias[d:]) / (n - d), buscando solo en la
+    primera `max_fraccion` de la serie. Retorna el índice (en observaciones) a
+    partir del cual conservar datos.
+    """
+    x = np.asarray(serie, dtype=float)
+    n = len(x) // lote
+    if n < 2:
+        return 0
+    medias = x[:n * lote].reshape(n, lote).mean(axis=1)
+
+    # sumas de sufijos para evaluar todos los d en una pasada
+    s1 = np.cumsum(medias[::-1])[::-1]
+    s2 = np.cumsum((medias ** 2)[::-1])[::-1]
+    restantes = n - np.arange(n)
+    suma_cuadrados = s2 - s1 ** 2 / restantes
+    estadistico = suma_cuadrados / restantes ** 2
+
+    limite = max(1, int(n * max_fraccion))
+    d = int(np.argmin(estadistico[:limite]))
+    return d * lote
+
+
+def series_simulacion(sim: Simulation) -> Dict[str, np.ndarray]:
+    """Series por tick de longitud de cola y utilización, promediadas entre cajeros."""
+    colas = [h["queue_length"] for h in sim.queue_length_history.values()]
+    utilizacion = [h["utilization"] for h in sim.checkout_utilization_history.values()]
+    return {
+        "cola": np.mean(colas, axis=0) if colas else np.array([]),
+        "utilizacion": np.mean(utilizacion, axis=0) if utilizacion else np.array([]),
+    }
+
+
+def detectar_calentamiento(sim: Simulation, lote: int = 5) -> dict:
+    """
+    Estima el tick de fin del calentamiento como el máximo de los puntos MSER
+    de la serie de colas y la de utilización.
+    """
+    inicio = sim.metrics_start_tick or 0
+    puntos = {nombre: mser(serie, lote) for nombre, serie in series_simulacion(sim).items()}
+    return {"puntos": puntos, "tick": inicio + max(puntos.values(), default=0)}
+
+
+def truncar_metricas(sim: Simulation, tick: int):
+    """Descarta las métricas recopiladas antes de `tick`."""
+    for historial, campo in ((sim.queue_length_history, "queue_length"),
+                             (sim.checkout_utilization_history, "utilization")):
+        for data in historial.values():
+            conservar = [k for k, t in enumerate(data["ticks"]) if t >= tick]
+            data["ticks"] = [data["ticks"][k] for k in conservar]
+            data[campo] = [data[campo][k] for k in conservar]
+    if sim.metrics_start_tick is not None:
+        descartar = max(0, tick - sim.metrics_start_tick)
+        sim.occupancy_history = sim.occupancy_history[descartar:]
+        sim.metrics_start_tick = max(sim.metrics_start_tick, tick)
+    sim.warmup_ticks = max(sim.warmup_ticks, tick)
+
+
+def calentar(sim: Simulation, ticks: int) -> Simulation:
+    """
+    Avanza la simulación `ticks` ticks sin recopilar el transitorio.
+    """
+    sim.warmup_ticks = sim.tick + ticks
+    sim.advance(ticks)
+    return sim
+
+
+def snapshot_caliente(sim: Simulation, ticks: Optional[int] = None) -> Simulation:
+    """
+    Copia de la simulación en su estado actual (opcionalmente tras calentarla
+    `ticks` ticks) con las métricas vacías, lista para reanudarse varias veces.
+    """
+    if ticks:
+        calentar(sim, ticks)
+    snapshot = copy.deepcopy(sim)
+    snapshot.reset_metrics()
+    snapshot.warmup_ticks = snapshot.tick
+    return snapshot
+
+
+def reanudar(snapshot: Simulation) -> Simulation:
+    """Nueva continuación independiente a partir de un snapshot caliente."""
+    return copy.deepcopy(snapshot)
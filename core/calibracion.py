@@ -0,0 +1,234 @@
+"""
+Calibración de las distribuciones de core.distribuciones a partir de datos reales.
+
+Lee CSVs grandes por bloques (pandas, chunksize), acumula estadísticos
+suficientes de forma vectorizada y maximiza la verosimilitud sobre esos
+agregados, por lo que el costo por fila es solo el de la lectura.
+
+Formatos de entrada:
+  - llegadas (contador de puerta): columnas dia, hora, clientes
+    (una fila por hora observada)
+  - paciencia: columna paciencia, valores en (0, 1)
+  - pasos (bitácora de movimiento): columnas tipo, velocidad, ticks
+    (ticks que tardó un cliente en avanzar una casilla)
+
+Uso:
+    python -m core.calibracion --llegadas conteos.csv --paciencia paciencia.csv \\
+        --pasos pasos.csv --salida parametros_distribuciones.json
+"""
+
+import argparse
+import copy
+import json
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import digamma, polygamma
+from scipy.stats import norm
+
+from core.distribuciones import PARAMETROS_DEFAULT, PARAMETROS_FILE
+
+CHUNKSIZE = 1_000_000
+
+
+def _banda_hora(horas: np.ndarray, bandas) -> np.ndarray:
+    """
+    Índice de banda horaria para cada hora; len(bandas) corresponde a 'resto'.
+    """
+    idx = np.full(horas.shape, len(bandas), dtype=np.int64)
+    for k, (inicio, fin, _) in enumerate(bandas):
+        idx[(horas >= inicio) & (horas < fin) & (idx == len(bandas))] = k
+    return idx
+
+
+def ajustar_llegadas(csv_path: str, bandas=None, dia_referencia: str = "jueves",
+                     chunksize: int = CHUNKSIZE, max_iter: int = 200, tol: float = 1e-10) -> dict:
+    """
+    Ajusta base_lambda, dia_factor y los factores por hora de un modelo
+    Poisson multiplicativo λ = base * dia_factor * hora_factor.
+
+    La MLE se obtiene con ajuste proporcional iterativo sobre los totales
+    por (día, banda), que son estadísticos suficientes del modelo.
+    El factor del día de referencia queda en 1 y los factores horarios
+    se normalizan a media 1 ponderada por horas observadas.
+    """
+    bandas = bandas if bandas is not None else PARAMETROS_DEFAULT["hora_factor"]
+    n_bandas = len(bandas) + 1
+    dias: Dict[str, int] = {}
+    suma = np.zeros((0, n_bandas))
+    horas_obs = np.zeros((0, n_bandas))
+
+    for chunk in pd.read_csv(csv_path, usecols=["dia", "hora", "clientes"], chunksize=chunksize):
+        dia = chunk["dia"].astype(str).str.strip().str.lower()
+        codigos, nombres = pd.factorize(dia)
+        # mapear códigos locales del bloque a índices globales de día
+        globales = np.array([dias.setdefault(n, len(dias)) for n in nombres], dtype=np.int64)
+        if len(dias) > suma.shape[0]:
+            extra = len(dias) - suma.shape[0]
+            suma = np.vstack([suma, np.zeros((extra, n_bandas))])
+            horas_obs = np.vstack([horas_obs, np.zeros((extra, n_bandas))])
+        d = globales[codigos]
+        b = _banda_hora(chunk["hora"].to_numpy(dtype=np.int64), bandas)
+        np.add.at(suma, (d, b), chunk["clientes"].to_numpy(dtype=float))
+        np.add.at(horas_obs, (d, b), 1.0)
+
+    if not dias:
+        raise ValueError(f"{csv_path} no contiene observaciones de llegadas")
+
+    # IPF: alterna las ecuaciones de verosimilitud de día y de banda
+    f_dia = np.ones(suma.shape[0])
+    f_hora = np.ones(n_bandas)
+    obs_dia = suma.sum(axis=1)
+    obs_hora = suma.sum(axis=0)
+    for _ in range(max_iter):
+        esperado_dia = horas_obs @ f_hora
+        nuevo_dia = np.divide(obs_dia, esperado_dia, out=np.zeros_like(obs_dia), where=esperado_dia > 0)
+        esperado_hora = nuevo_dia @ horas_obs
+        nuevo_hora = np.divide(obs_hora, esperado_hora, out=np.ones_like(obs_hora), where=esperado_hora > 0)
+        cambio = max(np.abs(nuevo_dia - f_dia).max(), np.abs(nuevo_hora - f_hora).max())
+        f_dia, f_hora = nuevo_dia, nuevo_hora
+        if cambio < tol:
+            break
+
+    # Normalización: horas con media 1, día de referencia en 1
+    peso_hora = horas_obs.sum(axis=0)
+    media_hora = (f_hora * peso_hora).sum() / peso_hora.sum()
+    f_hora /= media_hora
+    f_dia *= media_hora
+    ref = dias.get(dia_referencia)
+    base = f_dia[ref] if ref is not None and f_dia[ref] > 0 else f_dia.max()
+    f_dia /= base
+
+    return {
+        "base_lambda": float(base),
+        "dia_factor": {nombre: float(f_dia[i]) for nombre, i in dias.items()},
+        "hora_factor": [[inicio, fin, float(f_hora[k])] for k, (inicio, fin, _) in enumerate(bandas)],
+        "hora_factor_resto": float(f_hora[-1]),
+    }
+
+
+def ajustar_paciencia(csv_path: str, chunksize: int = CHUNKSIZE, max_iter: int = 100,
+                      tol: float = 1e-10) -> dict:
+    """
+    MLE de Beta(a, b) para la paciencia usando Newton sobre los estadísticos
+    suficientes (n, Σlog x, Σlog(1-x)); el punto inicial es el de momentos.
+    """
+    n = 0
+    s_log = s_log1m = s_x = s_x2 = 0.0
+    eps = 1e-9
+    for chunk in pd.read_csv(csv_path, usecols=["paciencia"], chunksize=chunksize):
+        x = np.clip(chunk["paciencia"].to_numpy(dtype=float), eps, 1 - eps)
+        n += x.size
+        s_log += np.log(x).sum()
+        s_log1m += np.log1p(-x).sum()
+        s_x += x.sum()
+        s_x2 += (x * x).sum()
+
+    if n == 0:
+        raise ValueError(f"{csv_path} no contiene observaciones de paciencia")
+
+    g1, g2 = s_log / n, s_log1m / n
+    media = s_x / n
+    var = max(s_x2 / n - media ** 2, eps)
+    comun = max(media * (1 - media) / var - 1, eps)
+    a, b = media * comun, (1 - media) * comun
+
+    for _ in range(max_iter):
+        psi_ab = digamma(a + b)
+        grad = np.array([digamma(a) - psi_ab - g1, digamma(b) - psi_ab - g2])
+        tri_ab = polygamma(1, a + b)
+        hess = np.array([[polygamma(1, a) - tri_ab, -tri_ab],
+                         [-tri_ab, polygamma(1, b) - tri_ab]])
+        paso = np.linalg.solve(hess, grad)
+        # mantener los parámetros positivos
+        while np.any(np.array([a, b]) - paso <= 0):
+            paso /= 2
+        a, b = a - paso[0], b - paso[1]
+        if np.abs(paso).max() < tol:
+            break
+
+    return {"paciencia_beta": [float(a), float(b)]}
+
+
+# rango de ticks que produce calc_move_delay: int(clip(normal, 1, 8))
+PASO_MIN, PASO_MAX = 1, 8
+
+
+def _log_verosimilitud_pasos(conteos: np.ndarray, media: float, desv: float) -> float:
+    """
+    Log-verosimilitud de los conteos por tick (PASO_MIN..PASO_MAX) bajo una
+    normal recortada a [PASO_MIN, PASO_MAX] y truncada a entero: el tick k
+    sale de [k, k+1), salvo los extremos que acumulan las colas recortadas.
+    """
+    bordes = np.arange(PASO_MIN + 1, PASO_MAX + 1, dtype=float)
+    cdf = norm.cdf(bordes, media, desv)
+    probs = np.diff(np.concatenate(([0.0], cdf, [1.0])))
+    return float(conteos @ np.log(np.maximum(probs, 1e-300)))
+
+
+def ajustar_pasos(csv_path: str, chunksize: int = CHUNKSIZE) -> dict:
+    """
+    Ajusta (media, desviación) de la normal del tiempo de paso por tipo y velocidad.
+
+    Los ticks observados son la normal recortada a [1, 8] y truncada a entero
+    (calc_move_delay), así que cada observación es un intervalo: se acumulan
+    los conteos por tick y se maximiza la verosimilitud censurada en intervalos
+    (scipy minimize sobre media y log-desviación, partiendo de los momentos).
+    """
+    n_ticks = PASO_MAX - PASO_MIN + 1
+    acumulado = {}
+    for chunk in pd.read_csv(csv_path, usecols=["tipo", "velocidad", "ticks"], chunksize=chunksize):
+        ticks = np.clip(chunk["ticks"].to_numpy(dtype=float), PASO_MIN, PASO_MAX).astype(np.int64)
+        grupos = pd.DataFrame({"tipo": chunk["tipo"], "velocidad": chunk["velocidad"], "k": ticks - PASO_MIN})
+        agregado = grupos.groupby(["tipo", "velocidad", "k"]).size()
+        for (tipo, velocidad, k), n in agregado.items():
+            conteos = acumulado.setdefault((tipo, velocidad), np.zeros(n_ticks))
+            conteos[k] += n
+
+    resultado: Dict[str, Dict[str, list]] = {}
+    valores = np.arange(PASO_MIN, PASO_MAX + 1, dtype=float)
+    for (tipo, velocidad), conteos in acumulado.items():
+        n = conteos.sum()
+        media0 = conteos @ valores / n + 0.5
+        desv0 = np.sqrt(max(conteos @ (valores + 0.5 - media0) ** 2 / n - 1 / 12, 0.01))
+        # cotas: si todo cae en un extremo la verosimilitud no tiene máximo finito
+        ajuste = minimize(lambda p: -_log_verosimilitud_pasos(conteos, p[0], np.exp(p[1])) / n,
+                          x0=[media0, np.log(desv0)], method="L-BFGS-B",
+                          bounds=[(PASO_MIN - 1, PASO_MAX + 1), (np.log(0.05), np.log(10.0))])
+        media, log_desv = ajuste.x
+        resultado.setdefault(tipo, {})[velocidad] = [float(media), float(np.exp(log_desv))]
+
+    return {"move_delay": resultado}
+
+
+def calibrar(llegadas: Optional[str] = None, paciencia: Optional[str] = None,
+             pasos: Optional[str] = None, salida: str = PARAMETROS_FILE) -> dict:
+    """
+    Ejecuta los ajustes disponibles y escribe el archivo de parámetros que carga core.distribuciones.
+    """
+    parametros = copy.deepcopy(PARAMETROS_DEFAULT)
+    if llegadas:
+        parametros.update(ajustar_llegadas(llegadas))
+    if paciencia:
+        parametros.update(ajustar_paciencia(paciencia))
+    if pasos:
+        parametros.update(ajustar_pasos(pasos))
+
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(parametros, f, indent=4, ensure_ascii=False)
+    return parametros
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibra las distribuciones del simulador desde CSVs")
+    parser.add_argument('--llegadas', help='CSV de contador de puerta (dia, hora, clientes)')
+    parser.add_argument('--paciencia', help='CSV con columna paciencia')
+    parser.add_argument('--pasos', help='CSV de tiempos de paso (tipo, velocidad, ticks)')
+    parser.add_argument('--salida', default=PARAMETROS_FILE, help='Archivo JSON de parámetros a escribir')
+    args = parser.parse_args()
+
+    params = calibrar(args.llegadas, args.paciencia, args.pasos, args.salida)
+    print(f"✅ Parámetros guardados en {args.salida}")
+    print(json.dumps(params, indent=2, ensure_ascii=False))
@@ -1,38 +1,125 @@
+import copy
+import json
+import os
 import random
 import numpy as np
 from scipy.stats import poisson, expon, beta, norm
 
+from core.eventos import registro, DEBUG, TRACE
 
-def clientes_por_hora(dia: str, hora: int) -> int:
+
+# Horario de apertura usado para generar un día completo de llegadas
+HORA_APERTURA = 8
+HORA_CIERRE = 22
+TICKS_POR_HORA = 60
+
+
+# Archivo de parámetros calibrados (ver core/calibracion.py)
+PARAMETROS_FILE = "parametros_distribuciones.json"
+
+# Parámetros por defecto de las distribuciones
+PARAMETROS_DEFAULT = {
+    # Tasa base de llegadas (clientes por hora)
+    "base_lambda": 10,
+    # Ajuste por día
+    "dia_factor": {
+        "lunes": 0.6, "martes": 0.7, "miércoles": 0.8,
+        "jueves": 1.0, "viernes": 1.3, "sábado": 1.5, "domingo": 1.2
+    },
+    # Ajuste por hora: [hora_inicio, hora_fin, factor]; fuera de las bandas aplica hora_factor_resto
+    "hora_factor": [[9, 12, 0.8], [12, 15, 1.5], [15, 18, 1.2]],
+    "hora_factor_resto": 0.9,
+    # Paciencia ~ Beta(a, b)
+    "paciencia_beta": [2, 5],
+    # Tiempo de paso: rangos base según rapidez y ajuste (media, desviación) para familias
+    "move_delay_rangos": {"Rapido": [1, 2], "Normal": [2, 4], "Tranquilo": [4, 5]},
+    "move_delay_familia": [1.3, 1.2],
+    # Ajustes calibrados {tipo: {rapidez: [media, desviación]}}; tienen prioridad sobre los rangos
+    "move_delay": {}
+}
+
+PARAMETROS = copy.deepcopy(PARAMETROS_DEFAULT)
+
+
+def cargar_parametros(file_path: str = PARAMETROS_FILE) -> dict:
     """
-    Genera el número esperado de clientes por hora usando Poisson.
+    Carga parámetros calibrados desde un JSON y los combina con los valores por defecto.
+    Si el archivo no existe se mantienen los valores por defecto.
+    """
+    PARAMETROS.clear()
+    PARAMETROS.update(copy.deepcopy(PARAMETROS_DEFAULT))
+    if file_path and os.path.exists(file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            PARAMETROS.update(json.load(f))
+    return PARAMETROS
+
+
+def tasa_llegadas(dia: str, hora: int) -> float:
+    """
+    Retorna la tasa λ (clientes por hora) según día y hora.
     """
     # Tasa base (por hora)
-    base_lambda = 10  
+    base_lambda = PARAMETROS["base_lambda"]
 
     # Ajuste por día
-    dia_factor = {
-        "lunes": 0.6, "martes": 0.7, "miércoles": 0.8,
-        "jueves": 1.0, "viernes": 1.3, "sábado": 1.5, "domingo": 1.2
-    }.get(dia.lower(), 1.0)
+    dia_factor = PARAMETROS["dia_factor"].get(dia.lower(), 1.0)
 
     # Ajuste por hora
-    if 9 <= hora < 12:
-        hora_factor = 0.8
-    elif 12 <= hora < 15:
-        hora_factor = 1.5  # hora pico
-    elif 15 <= hora < 18:
-        hora_factor = 1.2
-    else:
-        hora_factor = 0.9
+    hora_factor = PARAMETROS["hora_factor_resto"]
+    for inicio, fin, factor in PARAMETROS["hora_factor"]:
+        if inicio <= hora < fin:
+            hora_factor = factor
+            break
 
-    λ = base_lambda * dia_factor * hora_factor
-    print(f"dia: {dia}, hora: {hora}, λ: {λ}")
+    return base_lambda * dia_factor * hora_factor
+
+
+def clientes_por_hora(dia: str, hora: int, rng=None) -> int:
+    """
+    Genera el número esperado de clientes por hora usando Poisson.
+    rng: generador opcional (p.ej. un flujo de core.flujos); por defecto scipy/numpy global.
+    """
+    λ = tasa_llegadas(dia, hora)
+    if registro.nivel <= DEBUG:
+        registro.emitir(DEBUG, "llegadas.tasa", dia=dia, hora=hora, lmbda=λ)
+    if rng is not None:
+        return int(rng.poisson(λ))
     return poisson.rvs(λ)
 
-def calc_client_type(dia: str, hora: int) -> str:
+
+def generar_llegadas_dia(dia: str, hora_inicio: int = HORA_APERTURA, hora_fin: int = HORA_CIERRE,
+                         ticks_por_hora: int = TICKS_POR_HORA, rng: np.random.Generator = None):
     """
-    Retorna 'familia' o 'solo' según día y hora.
+    Generador de llegadas para un día completo (proceso de Poisson no homogéneo).
+
+    Usa thinning (Lewis-Shedler) en una sola pasada vectorizada: se generan
+    candidatos con la tasa máxima del día y se aceptan con probabilidad
+    λ(t) / λ_max. Produce tuplas (tick, hora) ordenadas, con tick 0 = hora_inicio.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    horas = np.arange(hora_inicio, hora_fin)
+    if len(horas) == 0:
+        return
+    tasas = np.array([tasa_llegadas(dia, int(h)) for h in horas])
+    lambda_max = tasas.max()
+    duracion = len(horas)  # en horas
+
+    # Candidatos homogéneos con tasa λ_max sobre todo el día
+    n = int(rng.poisson(lambda_max * duracion))
+    tiempos = np.sort(rng.random(n)) * duracion
+    idx_hora = np.minimum(tiempos.astype(int), duracion - 1)
+
+    # Thinning: aceptar cada candidato con probabilidad λ(t) / λ_max
+    aceptados = rng.random(n) < tasas[idx_hora] / lambda_max
+    ticks = (tiempos[aceptados] * ticks_por_hora).astype(int)
+    horas_llegada = horas[idx_hora[aceptados]]
+
+    for tick, hora in zip(ticks.tolist(), horas_llegada.tolist()):
+        yield tick, hora
+
+def _prob_familia(dia: str, hora: int) -> float:
+    """
+    Probabilidad de que un cliente sea 'familia' según día y hora.
     """
     prob_familia = 0.3  # base
     
@@ -43,23 +130,45 @@ def calc_client_type(dia: str, hora: int) -> str:
     if 9 <= hora <= 11:
         prob_familia -= 0.2
     
-    prob_familia = np.clip(prob_familia, 0, 1)
+    return float(np.clip(prob_familia, 0, 1))
+
+
+def calc_client_type(dia: str, hora: int) -> str:
+    """
+    Retorna 'familia' o 'solo' según día y hora.
+    """
+    prob_familia = _prob_familia(dia, hora)
     return "familia" if random.random() < prob_familia else "solo"
 
 
-def intervalo_entre_clientes(lmbda: float = 1/5) -> int:
+def calc_client_types(dia: str, hora: int, n: int, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Versión vectorizada de calc_client_type: n tipos en una sola llamada.
+    """
+    gen = rng if rng is not None else np.random
+    return np.where(gen.random(n) < _prob_familia(dia, hora), "familia", "solo")
+
+
+def intervalo_entre_clientes(lmbda: float = 1/5, rng=None) -> int:
     """
     Devuelve ticks entre llegadas (mínimo 1).
     λ controla la frecuencia de llegada (menor λ = llegadas más frecuentes)
     """
-    valor = int(expon.rvs(scale=1/lmbda))
-    print(f"valor: {max(1, valor)}")
+    if rng is not None:
+        valor = int(rng.exponential(scale=1/lmbda))
+    else:
+        valor = int(expon.rvs(scale=1/lmbda))
+    if registro.nivel <= TRACE:
+        registro.emitir(TRACE, "llegadas.intervalo", ticks=max(1, valor))
     return max(1, valor)
 
 
-def calc_speed(dia: str, hora: int, tipo: str) -> str:
+VELOCIDADES = ("Rapido", "Normal", "Tranquilo")
+
+
+def _probs_velocidad(dia: str, hora: int, tipo: str) -> dict:
     """
-    Retorna 'Rapido', 'Normal' o 'Tranquilo' basado en contexto.
+    Probabilidades normalizadas de 'Rapido', 'Normal' y 'Tranquilo'.
     """
     if tipo == "familia":
         probs = {"Rapido": 0.1, "Normal": 0.5, "Tranquilo": 0.2}
@@ -78,15 +187,63 @@ def calc_speed(dia: str, hora: int, tipo: str) -> str:
     total = sum(probs.values())
     for k in probs:
         probs[k] /= total
+    return probs
 
+
+def calc_speed(dia: str, hora: int, tipo: str) -> str:
+    """
+    Retorna 'Rapido', 'Normal' o 'Tranquilo' basado en contexto.
+    """
+    probs = _probs_velocidad(dia, hora, tipo)
     return random.choices(list(probs.keys()), weights=probs.values())[0]
 
 
+def calc_speeds(dia: str, hora: int, tipos: np.ndarray, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Versión vectorizada de calc_speed para un arreglo de tipos (CDF inversa por tipo).
+    """
+    gen = rng if rng is not None else np.random
+    tipos = np.asarray(tipos)
+    u = gen.random(tipos.shape[0])
+    resultado = np.empty(tipos.shape[0], dtype=object)
+    for tipo in ("familia", "solo"):
+        mask = tipos == tipo
+        if not mask.any():
+            continue
+        probs = _probs_velocidad(dia, hora, tipo)
+        acumulada = np.cumsum([probs[v] for v in VELOCIDADES])
+        idx = np.minimum(np.searchsorted(acumulada, u[mask], side="right"), len(VELOCIDADES) - 1)
+        resultado[mask] = np.array(VELOCIDADES, dtype=object)[idx]
+    return resultado
+
+
 def calc_paciencia() -> float:
     """
     Retorna un valor entre 0 y 1 representando la paciencia.
     """
-    return float(beta.rvs(2, 5))
+    a, b = PARAMETROS["paciencia_beta"]
+    return float(beta.rvs(a, b))
+
+
+def calc_paciencias(n: int, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Versión vectorizada de calc_paciencia.
+    """
+    a, b = PARAMETROS["paciencia_beta"]
+    gen = rng if rng is not None else np.random
+    return gen.beta(a, b, size=n)
+
+
+def calc_list_sizes(tipos: np.ndarray, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Número de productos en la lista de cada cliente (misma regla que Client.assign_list):
+    familias 8-14, solos normal(5, 2) truncada a [1, 10].
+    """
+    gen = rng if rng is not None else np.random
+    tipos = np.asarray(tipos)
+    familia = 8 + (gen.random(tipos.shape[0]) * 7).astype(int)
+    solo = np.clip(gen.normal(5, 2, size=tipos.shape[0]).astype(int), 1, 10)
+    return np.where(tipos == "familia", familia, solo)
 
 
 def noise_caja(mu=1, sigma=0.5) -> int:
@@ -96,22 +253,17 @@ def noise_caja(mu=1, sigma=0.5) -> int:
     valor = int(np.clip(norm.rvs(mu, sigma), 0, 3))
     return valor
 
-import numpy as np
-
-def calc_move_delay(tipo: str, rapidez: str) -> int:
+def _move_delay_params(tipo: str, rapidez: str):
     """
-    Calcula la cantidad de ticks que tarda un cliente en moverse una casilla,
-    dependiendo de su tipo y rapidez.
-    
-    tipo: 'familia' o 'solo'
-    rapidez: 'Rapido', 'Normal', 'Tranquilo'
+    Media y desviación de la normal usada para el tiempo de paso de un cliente.
     """
+    # Ajuste calibrado, si existe
+    ajustado = PARAMETROS["move_delay"].get(tipo, {}).get(rapidez)
+    if ajustado:
+        return tuple(ajustado)
+
     # Rangos base según rapidez
-    base_ranges = {
-        "Rapido":   (1, 2),
-        "Normal":   (2, 4),
-        "Tranquilo":(4, 5)
-    }
+    base_ranges = PARAMETROS["move_delay_rangos"]
 
     low, high = base_ranges.get(rapidez, (2, 4))
     mean = (low + high) / 2
@@ -120,11 +272,40 @@ def calc_move_delay(tipo: str, rapidez: str) -> int:
     # Penalización o ajuste por tipo de cliente
     if tipo == "familia":
         # Familias se mueven más lento (carreta, conversación, niños)
-        mean *= 1.3
-        std *= 1.2
+        factor_mean, factor_std = PARAMETROS["move_delay_familia"]
+        mean *= factor_mean
+        std *= factor_std
     elif tipo == "solo":
         mean *= 1.0
 
+    return mean, std
+
+
+def calc_move_delay(tipo: str, rapidez: str, rng=None) -> int:
+    """
+    Calcula la cantidad de ticks que tarda un cliente en moverse una casilla,
+    dependiendo de su tipo y rapidez.
+    
+    tipo: 'familia' o 'solo'
+    rapidez: 'Rapido', 'Normal', 'Tranquilo'
+    """
+    mean, std = _move_delay_params(tipo, rapidez)
+
     # Generar valor truncado
-    value = int(np.clip(np.random.normal(mean, std), 1, 8))
+    gen = rng if rng is not None else np.random
+    value = int(np.clip(gen.normal(mean, std), 1, 8))
     return max(1, value)
+
+
+def calc_move_delays(tipo: str, rapidez: str, n: int, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Versión vectorizada de calc_move_delay: genera n tiempos de paso independientes
+    con la misma distribución en una sola llamada.
+    """
+    mean, std = _move_delay_params(tipo, rapidez)
+    gen = rng if rng is not None else np.random
+    values = np.clip(gen.normal(mean, std, size=n), 1, 8).astype(int)
+    return np.maximum(values, 1)
+
+
+cargar_parametros()
@@ -0,0 +1,231 @@
+"""
+Escenarios de simulación: construcción del mapa y ejecución headless.
+
+Un escenario es un dict con las mismas claves que la configuración del
+WebSocket (day, hour, rows, cols, max_ticks, full_day) más checkouts y
+map_file. Al ser un dict plano se puede enviar a procesos worker y
+serializar como JSON.
+"""
+
+import os
+import contextlib
+import random
+from typing import List, Optional
+
+import numpy as np
+
+from core.store_map import StoreMap
+from core.simulation import Simulation
+from core.poblacion import FabricaClientes
+from core.flujos import Flujos
+from core.calentamiento import detectar_calentamiento, truncar_metricas
+from core.distribuciones import clientes_por_hora, intervalo_entre_clientes
+from entities.cell import CellType
+from entities.client import ClientPool
+
+ESCENARIO_DEFAULT = {
+    "day": "lunes",
+    "hour": 10,
+    "rows": 10,
+    "cols": 12,
+    "checkouts": 2,
+    "map_file": None,
+    "max_ticks": 300,
+    "full_day": False,
+    # calentamiento: None, ticks a descartar, o "auto" (MSER-5 sobre colas y utilización)
+    "warmup": None,
+    # desempate de cajas por distancia caminando en vez de Manhattan (cambia el modelo)
+    "distancia_caminando": False,
+}
+
+
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def directorio_mapas() -> str:
+    return os.environ.get("SIM_MAPAS_DIR") or os.path.join(RAIZ_PROYECTO, "mapas")
+
+
+def resolver_mapa(nombre: str) -> str:
+    """
+    Ruta del mapa `nombre` dentro del directorio de mapas (SIM_MAPAS_DIR, por
+    defecto mapas/). Para pedidos externos: no acepta rutas ni archivos de
+    fuera del directorio; ValueError si el nombre no es un mapa disponible.
+    """
+    directorio = os.path.realpath(directorio_mapas())
+    if not nombre or os.path.basename(nombre) != nombre or nombre.startswith("."):
+        raise ValueError(f"map_file debe ser el nombre de un mapa de {directorio_mapas()}: {nombre!r}")
+    ruta = os.path.realpath(os.path.join(directorio, nombre))
+    if os.path.dirname(ruta) != directorio or not os.path.isfile(ruta):
+        raise ValueError(f"Mapa no encontrado: {nombre!r}")
+    return ruta
+
+
+def normalizar_escenario(escenario: Optional[dict] = None) -> dict:
+    """Completa un escenario con los valores por defecto."""
+    completo = dict(ESCENARIO_DEFAULT)
+    completo.update(escenario or {})
+    return completo
+
+
+def build_store(rows=10, cols=12, num_cajas=2):
+    """Construye el mapa de la tienda"""
+    sm = StoreMap(rows=rows, cols=cols)
+    
+    # Entrada y salida
+    sm.grid[0][0].type = CellType.ENTRANCE
+    sm.grid[rows - 1][0].type = CellType.EXIT
+    
+    # Estanterías lado izquierdo - Lácteos
+    for i in range(1, min(8, rows-1)):
+        sm.grid[i][2].type = CellType.SHELF
+        sm.grid[i][2].category = "Lácteos"
+        sm.grid[i][2].product_id = 100 + i
+    
+    # Estanterías lado derecho - Snacks
+    for i in range(1, min(8, rows-1)):
+        if cols > 9:
+            sm.grid[i][9].type = CellType.SHELF
+            sm.grid[i][9].category = "Snacks"
+            sm.grid[i][9].product_id = 200 + i
+    
+    # Estanterías centrales
+    if cols > 6:
+        for i in range(2, min(7, rows-2)):
+            sm.grid[i][5].type = CellType.SHELF
+            sm.grid[i][5].category = "Bebidas"
+            sm.grid[i][5].product_id = 300 + i
+            
+            if cols > 6:
+                sm.grid[i][6].type = CellType.SHELF
+                sm.grid[i][6].category = "Pan"
+                sm.grid[i][6].product_id = 400 + i
+    
+    # Pasillos principales
+    for i in range(rows):
+        if cols > 4:
+            sm.grid[i][4].capacity = 6
+        if cols > 7:
+            sm.grid[i][7].capacity = 6
+    
+    for j in range(cols):
+        sm.grid[rows - 2][j].capacity = 6
+    
+    # Cajas (desde la esquina inferior derecha hacia la izquierda, sin tapar la salida)
+    for k in range(min(num_cajas, cols - 1)):
+        sm.grid[rows - 1][cols - 1 - k].type = CellType.CHECKOUT
+    
+    return sm
+
+def construir_mapa(escenario: dict) -> StoreMap:
+    """Construye el StoreMap del escenario: desde map_file o con build_store."""
+    if escenario.get("map_file"):
+        sm = StoreMap(from_file=escenario["map_file"])
+    else:
+        sm = build_store(rows=escenario["rows"], cols=escenario["cols"], num_cajas=escenario["checkouts"])
+    sm.walking_distance = bool(escenario.get("distancia_caminando", False))
+    return sm
+
+
+def preparar_simulacion(escenario: dict, semilla: Optional[int] = None,
+                        pool: Optional[ClientPool] = None, flujos: Optional[Flujos] = None,
+                        store_map: Optional[StoreMap] = None) -> Simulation:
+    """
+    Crea la simulación del escenario con sus llegadas programadas.
+
+    Con full_day se usa el generador de llegadas del día completo; si no,
+    se crean clientes_por_hora clientes espaciados como en el WebSocket.
+    Con `flujos` cada fuente de aleatoriedad usa su flujo dedicado
+    (números aleatorios comunes / variables antitéticas). Si se entrega
+    `store_map` (p. ej. construido desde core.mapa_compartido) se usa en
+    lugar de construir el mapa del escenario.
+    """
+    escenario = normalizar_escenario(escenario)
+    if semilla is not None:
+        random.seed(semilla)
+        np.random.seed(semilla % 2**32)
+    rng = np.random.default_rng(semilla)
+
+    sim = Simulation(store_map if store_map is not None else construir_mapa(escenario))
+    sim.max_ticks = escenario["max_ticks"]
+    sim.flujos = flujos
+    dia, hora = escenario["day"], escenario["hour"]
+    rng_llegadas = flujos.llegadas if flujos is not None else None
+    if escenario["full_day"]:
+        sim.schedule_day(dia, rng=None if flujos is not None else rng, pool=pool)
+    else:
+        if flujos is not None:
+            fabrica = FabricaClientes(dia, sim.map, pool=pool, rng=flujos.clientes, rng_listas=flujos.listas)
+        else:
+            fabrica = FabricaClientes(dia, sim.map, pool=pool, rng=rng)
+        arrival_tick = 0
+        for client in fabrica.crear(clientes_por_hora(dia, hora, rng=rng_llegadas), hora):
+            arrival_tick += intervalo_entre_clientes(lmbda=3, rng=rng_llegadas)
+            client.entry_tick = arrival_tick
+            sim.arrival_schedule.append((arrival_tick, client))
+    return sim
+
+
+def metricas_simulacion(sim: Simulation) -> dict:
+    """KPIs de una corrida: espera en cola, tiempo total, longitud de cola y utilización."""
+    # solo clientes que entraron después del calentamiento
+    atendidos = [c for c in sim.clients if c.finish_tick is not None and c.start_tick is not None
+                 and c.start_tick >= sim.warmup_ticks]
+    colas = [np.mean(h["queue_length"]) for h in sim.queue_length_history.values() if h["queue_length"]]
+    utilizacion = [np.mean(h["utilization"]) for h in sim.checkout_utilization_history.values() if h["utilization"]]
+    return {
+        "ticks": sim.tick,
+        "calentamiento": sim.warmup_ticks,
+        "clientes": len(sim.clients),
+        "clientes_atendidos": len(atendidos),
+        "espera_media": float(np.mean([c.time_waited for c in atendidos])) if atendidos else float("nan"),
+        "tiempo_total_medio": float(np.mean([c.finish_tick - c.start_tick for c in atendidos])) if atendidos else float("nan"),
+        "cola_media": float(np.mean(colas)) if colas else float("nan"),
+        "utilizacion_media": float(np.mean(utilizacion)) if utilizacion else float("nan"),
+    }
+
+
+def ejecutar_escenario(escenario: dict, semilla: Optional[int] = None,
+                       pool: Optional[ClientPool] = None, flujos: Optional[Flujos] = None,
+                       store_map: Optional[StoreMap] = None) -> dict:
+    """
+    Ejecuta una corrida headless (sin salida por consola ni pausas) y retorna sus KPIs.
+    """
+    escenario = normalizar_escenario(escenario)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        sim = preparar_simulacion(escenario, semilla, pool=pool, flujos=flujos, store_map=store_map)
+        warmup = escenario["warmup"]
+        if isinstance(warmup, int):
+            sim.warmup_ticks = warmup
+        sim.run(max_ticks=escenario["max_ticks"], tick_delay=0, visualize=False)
+    if warmup == "auto":
+        truncar_metricas(sim, detectar_calentamiento(sim)["tick"])
+    metricas = metricas_simulacion(sim)
+    if pool is not None:
+        pool.release(sim.clients)
+    return metricas
+
+
+def graficas_escenario(escenario: dict, semilla: Optional[int], directorio: str) -> List[str]:
+    """
+    Corre una réplica del escenario y guarda sus gráficas (analytics) en
+    `directorio`. Retorna las rutas de los PNG relativas a `directorio`.
+    """
+    from analytics import SimulationAnalytics
+    from core.frames import serializar_metricas_cliente
+
+    escenario = normalizar_escenario(escenario)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        sim = preparar_simulacion(escenario, semilla)
+        sim.run(max_ticks=escenario["max_ticks"], tick_delay=0, visualize=False)
+        datos = sim.get_analytics_data()
+        clientes = [serializar_metricas_cliente(c) for c in sim.clients]
+        # las gráficas individuales, sin las combinadas de analytics2 (esas leen todo resultados_simulacion)
+        analytics = SimulationAnalytics(output_dir=directorio)
+        dia, hora, marca = escenario["day"], escenario["hour"], "replica"
+        analytics.plot_client_times(clientes, dia, hora, marca)
+        analytics.plot_checkout_utilization(datos["checkout_utilization"], dia, hora, marca)
+        analytics.plot_queue_lengths(datos["queue_lengths"], dia, hora, marca)
+        analytics.plot_time_by_type(clientes, dia, hora, marca)
+    return sorted(os.path.relpath(os.path.join(raiz, nombre), directorio)
+                  for raiz, _, nombres in os.walk(directorio) for nombre in nombres if nombre.endswith(".png"))
@@ -0,0 +1,160 @@
+"""
+Registro estructurado de eventos con niveles.
+
+Reemplaza los print() de las rutas calientes (planificación de caminos,
+elección de caja, llegadas, servicio en caja). Un evento es un nombre más
+campos clave=valor. Los niveles deshabilitados no cuestan nada: en cada
+punto de emisión se compara el nivel antes de construir los campos:
+
+    if registro.nivel <= DEBUG:
+        registro.emitir(DEBUG, "cliente.camino", cliente=self.id, camino=self.path)
+
+Sumideros disponibles: consola (texto), memoria (lista) y binario con
+buffer (registros pickle con prefijo de longitud, ver leer_eventos).
+El nivel inicial se puede fijar con la variable de entorno SIM_EVENTOS
+(p. ej. SIM_EVENTOS=debug).
+"""
+
+import os
+import pickle
+import struct
+import sys
+import time
+from typing import Iterator, List, Optional
+
+TRACE = 5
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+APAGADO = 100
+
+NOMBRES_NIVELES = {"trace": TRACE, "debug": DEBUG, "info": INFO,
+                   "warning": WARNING, "error": ERROR, "apagado": APAGADO}
+
+_LONGITUD = struct.Struct("<I")
+
+
+class SumideroConsola:
+    """Escribe cada evento como una línea de texto: [nombre] campo=valor ..."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def escribir(self, evento: tuple):
+        _, _, nombre, campos = evento
+        texto = " ".join(f"{k}={v}" for k, v in campos.items())
+        # sys.stdout se resuelve en cada llamada para respetar redirect_stdout
+        print(f"[{nombre}] {texto}", file=self.stream or sys.stdout)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SumideroMemoria:
+    """Guarda los eventos en una lista (útil para análisis posterior)."""
+
+    def __init__(self):
+        self.eventos: List[tuple] = []
+
+    def escribir(self, evento: tuple):
+        self.eventos.append(evento)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SumideroBinario:
+    """
+    Acumula eventos en memoria y los escribe en bloques a un archivo binario:
+    cada bloque es un pickle de la lista de eventos precedido de su longitud.
+    """
+
+    def __init__(self, path: str, buffer: int = 4096):
+        self.path = path
+        self.buffer = buffer
+        self._pendientes: List[tuple] = []
+        self._f = open(path, "ab")
+
+    def escribir(self, evento: tuple):
+        self._pendientes.append(evento)
+        if len(self._pendientes) >= self.buffer:
+            self.flush()
+
+    def flush(self):
+        if not self._pendientes:
+            return
+        datos = pickle.dumps(self._pendientes, protocol=pickle.HIGHEST_PROTOCOL)
+        self._f.write(_LONGITUD.pack(len(datos)))
+        self._f.write(datos)
+        self._f.flush()
+        self._pendientes = []
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+
+def leer_eventos(path: str) -> Iterator[tuple]:
+    """Itera los eventos (timestamp, nivel, nombre, campos) de un archivo de SumideroBinario."""
+    with open(path, "rb") as f:
+        while True:
+            cabecera = f.read(_LONGITUD.size)
+            if len(cabecera) < _LONGITUD.size:
+                return
+            (n,) = _LONGITUD.unpack(cabecera)
+            yield from pickle.loads(f.read(n))
+
+
+class RegistroEventos:
+    """
+    Registro de eventos. `nivel` es un atributo simple para que la
+    comprobación en los puntos de emisión sea una sola comparación.
+    """
+
+    def __init__(self, nivel: int = INFO, sumidero=None):
+        self.nivel = nivel
+        self.sumidero = sumidero if sumidero is not None else SumideroConsola()
+
+    def configurar(self, nivel=None, sumidero=None):
+        """Cambia el nivel (int o nombre) y/o el sumidero; cierra el sumidero anterior."""
+        if nivel is not None:
+            self.nivel = NOMBRES_NIVELES[nivel.lower()] if isinstance(nivel, str) else nivel
+        if sumidero is not None and sumidero is not self.sumidero:
+            self.sumidero.close()
+            self.sumidero = sumidero
+
+    def habilitado(self, nivel: int) -> bool:
+        return self.nivel <= nivel
+
+    def emitir(self, nivel: int, nombre: str, **campos):
+        if self.nivel <= nivel:
+            self.sumidero.escribir((time.time(), nivel, nombre, campos))
+
+    def flush(self):
+        self.sumidero.flush()
+
+
+def _nivel_entorno(defecto: int) -> int:
+    valor = os.environ.get("SIM_EVENTOS")
+    if not valor:
+        return defecto
+    return NOMBRES_NIVELES.get(valor.lower(), defecto)
+
+
+# registro global usado por la simulación
+registro = RegistroEventos(nivel=_nivel_entorno(INFO))
+
+
+def configurar(nivel=None, sumidero=None, path: Optional[str] = None, buffer: int = 4096):
+    """Atajo: configurar(nivel="debug", path="eventos.bin") usa un SumideroBinario."""
+    if path is not None:
+        sumidero = SumideroBinario(path, buffer)
+    registro.configurar(nivel, sumidero)
+    return registro
@@ -0,0 +1,78 @@
+"""
+Flujos de números aleatorios dedicados para técnicas de reducción de varianza.
+
+Cada fuente de aleatoriedad (llegadas, atributos de clientes, listas,
+servicio en caja, tiempos de paso y comportamiento) usa su propio flujo,
+derivado de una semilla común. Así, dos configuraciones corridas con la
+misma semilla consumen los mismos números para lo mismo (números
+aleatorios comunes) aunque una de ellas consuma más de otro flujo.
+
+Todas las distribuciones se generan por transformada inversa a partir de
+uniformes, de modo que el flujo antitético (1 - u) produce la réplica
+negativamente correlacionada de cada variable.
+"""
+
+from typing import Optional
+
+import numpy as np
+from scipy.stats import norm, beta, poisson
+
+NOMBRES_FLUJOS = ("llegadas", "clientes", "listas", "servicio", "movimiento", "comportamiento")
+
+_EPS = 1e-12
+
+
+class Flujo:
+    """
+    Generador con la misma interfaz que usa core.distribuciones
+    (random, uniform, integers, normal, beta, poisson, exponential),
+    implementado por transformada inversa para admitir variables antitéticas.
+    """
+
+    def __init__(self, seed_seq, antitetico: bool = False):
+        self.gen = np.random.default_rng(seed_seq)
+        self.antitetico = antitetico
+
+    def random(self, size=None):
+        u = self.gen.random(size)
+        return 1.0 - u if self.antitetico else u
+
+    def _u(self, size=None):
+        # uniformes en el intervalo abierto (0, 1) para las inversas
+        return np.clip(self.random(size), _EPS, 1 - _EPS)
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        return low + (high - low) * self.random(size)
+
+    def integers(self, low, high=None, size=None):
+        if high is None:
+            low, high = 0, low
+        valores = np.minimum(low + np.floor(self.random(size) * (high - low)), high - 1).astype(int)
+        return int(valores) if size is None else valores
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return loc + scale * norm.ppf(self._u(size))
+
+    def beta(self, a, b, size=None):
+        return beta.ppf(self._u(size), a, b)
+
+    def poisson(self, lam, size=None):
+        valores = poisson.ppf(self._u(size), lam).astype(int)
+        return int(valores) if size is None else valores
+
+    def exponential(self, scale=1.0, size=None):
+        return -scale * np.log1p(-self._u(size))
+
+
+class Flujos:
+    """
+    Conjunto de flujos con nombre derivados de una semilla.
+    Con antitetico=True todos los flujos entregan 1 - u.
+    """
+
+    def __init__(self, semilla: Optional[int] = None, antitetico: bool = False):
+        self.semilla = semilla
+        self.antitetico = antitetico
+        hijos = np.random.SeedSequence(semilla).spawn(len(NOMBRES_FLUJOS))
+        for nombre, hijo in zip(NOMBRES_FLUJOS, hijos):
+            setattr(self, nombre, Flujo(hijo, antitetico))
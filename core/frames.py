@@ -0,0 +1,467 @@
+"""
+Frames del WebSocket: estado completo (keyframe) y deltas.
+
+Un keyframe es el mismo dict que produce api.serialize_simulation_state
+más {"frame": "key", "seq": n}. Entre keyframes se envían deltas con solo
+lo que cambió desde el frame anterior:
+
+    {"frame": "delta", "seq": n,
+     "stats": {...},                         # siempre (es pequeño)
+     "cells": {"i,j": celda, ...},           # celdas cuyo contenido cambió
+     "client_metrics": {"id": metricas, ...},
+     "console_rows": {"i": "línea", ...}}    # líneas del mapa de consola que cambiaron
+
+Solo se serializan las celdas ocupadas (o que lo estaban en el frame
+anterior) y los clientes que no habían terminado, así que el costo por
+tick depende de los clientes activos y no del tamaño del mapa.
+fusionar_frames aplica un frame sobre un estado completo.
+
+Formato binario (negociado con {"formato": "binario"} en la configuración,
+ver codificar_binario): cabecera fija + arreglos tipados little-endian con
+ocupación y largo de cola por celda y posición/estado de cada agente.
+"""
+
+import json
+import struct
+import threading
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from entities.cell import CellType
+
+
+def serializar_celda(cell) -> dict:
+    """Celda con sus clientes y su cola, en el formato que dibuja static/app.js."""
+    cell_data = {
+        "type": cell.type.value,
+        "clients": [],
+        "queue": [],
+        "capacity": cell.capacity,
+        "occupancy": len(cell.clients) / cell.capacity if cell.capacity > 0 else 0
+    }
+
+    # Información de estanterías
+    if cell.type == CellType.SHELF:
+        cell_data["category"] = cell.category
+        cell_data["product_id"] = cell.product_id
+
+    # Clientes en la celda
+    for client in cell.clients:
+        cell_data["clients"].append({
+            "id": getattr(client, 'id', None),
+            "tipo": getattr(client, 'tipo', None),
+            "velocidad": getattr(client, 'velocidad', None),
+            "patience": getattr(client, 'patience', None),
+            "items_left": len(getattr(client, 'lista', [])),
+            "shopping_done": getattr(client, 'shopping_done', False),
+            # copia: el delta compara contra lo último enviado y el cliente muta su path
+            "path": list(getattr(client, 'path', None) or [])
+        })
+
+    # Cola de checkout
+    if cell.type == CellType.CHECKOUT:
+        for client in cell.queue:
+            cell_data["queue"].append({
+                "id": getattr(client, 'id', None),
+                "tipo": getattr(client, 'tipo', None),
+                "velocidad": getattr(client, 'velocidad', None),
+                "patience": getattr(client, 'patience', None),
+                "time_waited": getattr(client, 'time_waited', None)
+            })
+    return cell_data
+
+
+def serializar_metricas_cliente(c) -> dict:
+    """Métricas por cliente (ticks de inicio/fin y tiempo total si terminó)."""
+    start = getattr(c, 'start_tick', None)
+    finish = getattr(c, 'finish_tick', None)
+    total_time = None
+    if start is not None and finish is not None:
+        try:
+            total_time = int(finish - start)
+        except Exception:
+            total_time = None
+    return {
+        "id": getattr(c, 'id', None),
+        "tipo": getattr(c, 'tipo', None),
+        "velocidad": getattr(c, 'velocidad', None),
+        "patience": getattr(c, 'patience', None),
+        "items_left": len(getattr(c, 'lista', [])) if getattr(c, 'lista', None) is not None else None,
+        "items_total": getattr(c, 'items_total', None),
+        "shopping_done": getattr(c, 'shopping_done', False),
+        "in_queue": getattr(c, 'in_queue', False),
+        "start_tick": start,
+        "finish_tick": finish,
+        "total_time": total_time,
+        "checkout_time": getattr(c, 'checkout_time', None)
+    }
+
+
+def estadisticas(sim) -> dict:
+    return {
+        "tick": sim.tick,
+        "total_clients": len(sim.clients),
+        "active_clients": sum(1 for c in sim.clients if not getattr(c, 'shopping_done', False)),
+        "clients_shopping": sum(1 for c in sim.clients if not getattr(c, 'in_queue', False) and not getattr(c, 'shopping_done', False)),
+        "clients_in_queue": sum(1 for c in sim.clients if getattr(c, 'in_queue', False)),
+        "clients_done": sum(1 for c in sim.clients if getattr(c, 'shopping_done', False))
+    }
+
+
+def mapa_consola(sim) -> Optional[str]:
+    try:
+        return sim.map.get_console_map()
+    except Exception:
+        return None
+
+
+def estado_completo(sim) -> dict:
+    """Estado completo de la simulación (formato histórico del WebSocket)."""
+    grid = sim.map.grid
+    return {
+        "cells": [[serializar_celda(cell) for cell in row] for row in grid],
+        "stats": estadisticas(sim),
+        "rows": sim.map.rows,
+        "cols": sim.map.cols,
+        "console_map": mapa_consola(sim),
+        "client_metrics": [serializar_metricas_cliente(c) for c in getattr(sim, 'clients', [])]
+    }
+
+
+class CodificadorDeltas:
+    """
+    Produce un keyframe cada `cada` frames y deltas entre ellos.
+    Mantiene lo último enviado por celda, por cliente y por línea de consola.
+    """
+
+    def __init__(self, cada: int = 50):
+        self.cada = max(1, int(cada))
+        self.seq = 0
+        self._celdas: Dict[tuple, dict] = {}
+        self._ocupadas: set = set()
+        self._metricas: Dict[int, dict] = {}
+        self._terminados: set = set()
+        self._consola: list = []
+
+    def _recordar(self, estado: dict, sim):
+        self._celdas = {}
+        self._ocupadas = set()
+        for i, row in enumerate(estado["cells"]):
+            for j, cell_data in enumerate(row):
+                self._celdas[(i, j)] = cell_data
+                if cell_data["clients"] or cell_data["queue"]:
+                    self._ocupadas.add((i, j))
+        self._metricas = {m["id"]: m for m in estado["client_metrics"]}
+        self._terminados = {c.id for c in sim.clients if getattr(c, 'shopping_done', False)}
+        self._consola = (estado["console_map"] or "").split("\n")
+
+    def keyframe(self, sim) -> dict:
+        estado = estado_completo(sim)
+        self._recordar(estado, sim)
+        estado["frame"] = "key"
+        estado["seq"] = self.seq
+        self.seq += 1
+        return estado
+
+    def codificar(self, sim, forzar_keyframe: bool = False) -> dict:
+        """Siguiente frame: keyframe si toca (o se fuerza), delta en otro caso."""
+        if forzar_keyframe or self.seq % self.cada == 0:
+            return self.keyframe(sim)
+
+        celdas = {}
+        ocupadas = set()
+        grid = sim.map.grid
+        for i, row in enumerate(grid):
+            for j, cell in enumerate(row):
+                if cell.clients or cell.queue:
+                    ocupadas.add((i, j))
+                elif (i, j) not in self._ocupadas:
+                    continue
+                cell_data = serializar_celda(cell)
+                if cell_data != self._celdas.get((i, j)):
+                    self._celdas[(i, j)] = cell_data
+                    celdas[f"{i},{j}"] = cell_data
+        self._ocupadas = ocupadas
+
+        metricas = {}
+        for c in sim.clients:
+            if c.id in self._terminados:
+                continue
+            m = serializar_metricas_cliente(c)
+            if m != self._metricas.get(c.id):
+                self._metricas[c.id] = m
+                metricas[str(c.id)] = m
+            if m["shopping_done"]:
+                self._terminados.add(c.id)
+
+        lineas = (mapa_consola(sim) or "").split("\n")
+        consola = {str(i): linea for i, linea in enumerate(lineas)
+                   if i >= len(self._consola) or self._consola[i] != linea}
+        self._consola = lineas
+
+        frame = {"frame": "delta", "seq": self.seq, "stats": estadisticas(sim),
+                 "cells": celdas, "client_metrics": metricas, "console_rows": consola}
+        self.seq += 1
+        return frame
+
+
+def fusionar_frames(estado: Optional[dict], frame: dict) -> dict:
+    """
+    Aplica `frame` sobre `estado` (estado completo, se modifica en el lugar) y lo retorna.
+    Un keyframe reemplaza el estado; un frame sin campo "frame" se trata como completo.
+    Los frames "metricas" (modo binario) reemplazan métricas y mapa de consola.
+    """
+    if frame.get("frame", "key") == "key" or estado is None:
+        return dict(frame)
+    if frame["frame"] == "metricas":
+        estado["client_metrics"] = frame["client_metrics"]
+        estado["console_map"] = frame["console_map"]
+        return estado
+
+    for clave, cell_data in frame.get("cells", {}).items():
+        i, j = map(int, clave.split(","))
+        estado["cells"][i][j] = cell_data
+
+    metricas = frame.get("client_metrics", {})
+    if metricas:
+        indice = {m["id"]: k for k, m in enumerate(estado["client_metrics"])}
+        for m in metricas.values():
+            k = indice.get(m["id"])
+            if k is None:
+                estado["client_metrics"].append(m)
+            else:
+                estado["client_metrics"][k] = m
+
+    filas = frame.get("console_rows", {})
+    if filas:
+        lineas = (estado.get("console_map") or "").split("\n")
+        for clave, linea in filas.items():
+            i = int(clave)
+            lineas.extend([""] * (i + 1 - len(lineas)))
+            lineas[i] = linea
+        estado["console_map"] = "\n".join(lineas)
+
+    estado["stats"] = frame["stats"]
+    estado["seq"] = frame["seq"]
+    if frame.get("final"):
+        estado["final"] = True
+    return estado
+
+
+# ---------------------------------------------------------------------------
+# Formato binario
+#
+# Cabecera (44 bytes, little-endian):
+#   magia "GSF1", version u8, flags u8 (bit0 final), rows u16, cols u16,
+#   descartados u16 (frames anteriores que se omitieron al coalescer),
+#   tick u32, seq u32, n_agentes u32,
+#   total_clients, active_clients, clients_shopping, clients_in_queue, clients_done (u32)
+# Luego, en este orden (alineados para Uint32Array/Uint16Array en el navegador):
+#   ids u32[n], filas u16[n], columnas u16[n], cola u16[rows*cols],
+#   ocupacion u8[rows*cols], estado u8[n]
+# Los agentes se listan celda por celda (primero clients, luego queue).
+# estado: bit0 familia, bit1 en cola, bit2 terminó.
+# ---------------------------------------------------------------------------
+
+MAGIA_BINARIA = b"GSF1"
+VERSION_BINARIA = 2
+CABECERA_BINARIA = struct.Struct("<4sBBHHHIIIIIIII")
+_OFFSET_FLAGS = 5
+_OFFSET_DESCARTADOS = 10
+
+ESTADO_FAMILIA = 1
+ESTADO_EN_COLA = 2
+ESTADO_TERMINADO = 4
+
+
+def _estado_agente(client, en_cola: bool) -> int:
+    estado = ESTADO_FAMILIA if getattr(client, 'tipo', None) == "familia" else 0
+    if en_cola:
+        estado |= ESTADO_EN_COLA
+    if getattr(client, 'shopping_done', False):
+        estado |= ESTADO_TERMINADO
+    return estado
+
+
+def codificar_binario(sim, seq: int = 0, final: bool = False) -> bytes:
+    """Frame binario con la grilla y los agentes del tick actual."""
+    rows, cols = sim.map.rows, sim.map.cols
+    ocupacion = np.zeros(rows * cols, dtype=np.uint8)
+    cola = np.zeros(rows * cols, dtype=np.uint16)
+    ids, filas, columnas, estados = [], [], [], []
+    for i, row in enumerate(sim.map.grid):
+        for j, cell in enumerate(row):
+            if not cell.clients and not cell.queue:
+                continue
+            k = i * cols + j
+            ocupacion[k] = min(len(cell.clients), 255)
+            cola[k] = len(cell.queue)
+            for client in cell.clients:
+                ids.append(client.id)
+                filas.append(i)
+                columnas.append(j)
+                estados.append(_estado_agente(client, False))
+            for client in cell.queue:
+                ids.append(client.id)
+                filas.append(i)
+                columnas.append(j)
+                estados.append(_estado_agente(client, True))
+
+    stats = estadisticas(sim)
+    cabecera = CABECERA_BINARIA.pack(
+        MAGIA_BINARIA, VERSION_BINARIA, 1 if final else 0, rows, cols, 0,
+        sim.tick, seq, len(ids),
+        stats["total_clients"], stats["active_clients"], stats["clients_shopping"],
+        stats["clients_in_queue"], stats["clients_done"])
+    return b"".join((
+        cabecera,
+        np.asarray(ids, dtype="<u4").tobytes(),
+        np.asarray(filas, dtype="<u2").tobytes(),
+        np.asarray(columnas, dtype="<u2").tobytes(),
+        cola.astype("<u2").tobytes(),
+        ocupacion.tobytes(),
+        np.asarray(estados, dtype=np.uint8).tobytes(),
+    ))
+
+
+def decodificar_binario(data: bytes) -> dict:
+    """Inverso de codificar_binario (arreglos numpy sin copia sobre `data`)."""
+    (magia, version, flags, rows, cols, descartados, tick, seq, n,
+     total, activos, comprando, en_cola, terminados) = CABECERA_BINARIA.unpack_from(data)
+    if magia != MAGIA_BINARIA or version != VERSION_BINARIA:
+        raise ValueError("Frame binario no reconocido")
+    celdas = rows * cols
+    off = CABECERA_BINARIA.size
+    arreglos = {}
+    for nombre, dtype, cantidad in (("ids", "<u4", n), ("filas", "<u2", n), ("columnas", "<u2", n),
+                                    ("cola", "<u2", celdas), ("ocupacion", "u1", celdas),
+                                    ("estado", "u1", n)):
+        arreglos[nombre] = np.frombuffer(data, dtype=dtype, count=cantidad, offset=off)
+        off += arreglos[nombre].nbytes
+    arreglos["cola"] = arreglos["cola"].reshape(rows, cols)
+    arreglos["ocupacion"] = arreglos["ocupacion"].reshape(rows, cols)
+    return {
+        "seq": seq, "final": bool(flags & 1), "rows": rows, "cols": cols, "descartados": descartados,
+        "stats": {"tick": tick, "total_clients": total, "active_clients": activos,
+                  "clients_shopping": comprando, "clients_in_queue": en_cola, "clients_done": terminados},
+        **arreglos,
+    }
+
+
+def marcar_final_binario(frame: bytes) -> bytes:
+    """Copia del frame binario con el flag final encendido."""
+    marcado = bytearray(frame)
+    marcado[_OFFSET_FLAGS] |= 1
+    return bytes(marcado)
+
+
+def metricas_frame(sim, seq: int = 0) -> dict:
+    """Frame JSON con lo que no viaja en binario: métricas por cliente y mapa de consola."""
+    return {"frame": "metricas", "seq": seq,
+            "client_metrics": [serializar_metricas_cliente(c) for c in getattr(sim, 'clients', [])],
+            "console_map": mapa_consola(sim)}
+
+
+# ---------------------------------------------------------------------------
+# Coalescencia de frames para consumidores lentos
+# ---------------------------------------------------------------------------
+
+def codificar_payload(frame: Union[dict, bytes]) -> Union[str, bytes]:
+    """Frame listo para el socket: JSON para dicts, bytes tal cual."""
+    return frame if isinstance(frame, (bytes, bytearray)) else json.dumps(frame)
+
+
+def tipo_frame(frame: Union[dict, bytes]) -> Optional[str]:
+    """Tipo del frame para las salas: 'key', 'delta', 'metricas', 'binario', 'formato' o None."""
+    if isinstance(frame, (bytes, bytearray)):
+        return "binario"
+    tipo = frame.get("frame", "key")
+    return tipo if tipo in ("key", "delta", "metricas", "formato") else None
+
+
+def _canal(frame) -> Optional[str]:
+    """
+    Canal de coalescencia: 'estado' (grilla), 'metricas', o None si no se puede
+    omitir. El keyframe estático del modo binario (celdas que los frames
+    binarios no traen) va sin canal: un frame binario no lo reemplaza.
+    """
+    if isinstance(frame, (bytes, bytearray)):
+        return "estado"
+    if frame.get("estatico"):
+        return None
+    tipo = frame.get("frame", "key")
+    if tipo in ("key", "delta"):
+        return "estado"
+    if tipo == "metricas":
+        return "metricas"
+    return None
+
+
+def fusionar_deltas(anterior: dict, delta: dict) -> dict:
+    """Un delta equivalente a aplicar `anterior` y luego `delta` (ambos deltas)."""
+    fusion = dict(delta)
+    for clave in ("cells", "client_metrics", "console_rows"):
+        fusion[clave] = {**anterior.get(clave, {}), **delta.get(clave, {})}
+    return fusion
+
+
+class BufferFrames:
+    """
+    Buffer entre la simulación (que sigue avanzando) y un emisor lento.
+
+    poner() nunca bloquea: si todavía hay un frame del mismo canal sin enviar,
+    el nuevo lo reemplaza (keyframes, estados completos y frames binarios) o
+    se fusiona con él (deltas), de modo que el emisor siempre toma el estado
+    más reciente. Cada frame lleva en "descartados" (o en la cabecera binaria)
+    cuántos frames intermedios se omitieron.
+    """
+
+    def __init__(self):
+        self._pendientes: List[list] = []  # [frame, canal, descartados]
+        self._cond = threading.Condition()
+        self._cerrado = False
+        self.descartados_total = 0
+
+    def poner(self, frame: Union[dict, bytes]):
+        canal = _canal(frame)
+        with self._cond:
+            for item in self._pendientes:
+                if canal is not None and item[1] == canal:
+                    item[0] = self._combinar(item[0], frame)
+                    item[2] += 1
+                    self.descartados_total += 1
+                    break
+            else:
+                self._pendientes.append([frame, canal, 0])
+            self._cond.notify()
+
+    @staticmethod
+    def _combinar(anterior, nuevo):
+        if isinstance(nuevo, (bytes, bytearray)) or nuevo.get("frame", "key") == "key":
+            return nuevo
+        # delta: sobre un estado completo se aplica, sobre otro delta se fusiona
+        if anterior.get("frame", "key") == "key":
+            return fusionar_frames(anterior, nuevo)
+        return fusionar_deltas(anterior, nuevo)
+
+    def tomar(self, timeout: Optional[float] = None) -> Optional[Union[dict, bytes]]:
+        """Siguiente frame (bloquea hasta que haya uno); None cuando se cerró y no queda nada."""
+        with self._cond:
+            while not self._pendientes and not self._cerrado:
+                if not self._cond.wait(timeout):
+                    return None
+            if not self._pendientes:
+                return None
+            frame, _, descartados = self._pendientes.pop(0)
+        if isinstance(frame, (bytes, bytearray)):
+            frame = bytearray(frame)
+            struct.pack_into("<H", frame, _OFFSET_DESCARTADOS, min(descartados, 0xFFFF))
+            return bytes(frame)
+        frame["descartados"] = descartados
+        return frame
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify_all()
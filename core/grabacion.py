@@ -0,0 +1,279 @@
+"""
+Grabación de corridas para reproducirlas sin volver a simular.
+
+Una grabación son dos archivos en el directorio de grabaciones
+(SIM_GRABACIONES_DIR, por defecto grabaciones/):
+
+  <run_id>.sim   registros consecutivos: cabecera REGISTRO (longitud u32,
+                 tick u32, tipo u8: 0 keyframe, 1 delta) y el frame JSON
+                 comprimido con zlib. Son los mismos keyframes y deltas que
+                 produce CodificadorDeltas.
+  <run_id>.json  índice: metadatos de la corrida y la lista de keyframes
+                 [tick, offset] para saltar a cualquier tick.
+
+Para ir al tick T se lee desde el último keyframe con tick <= T y se
+fusionan los deltas hasta T (a lo sumo keyframe_every registros). Si el
+índice falta (la corrida se cortó) se reconstruye leyendo solo cabeceras.
+
+El tamaño del directorio se acota como la caché de resultados: al cerrar
+una grabación se borran las menos usadas (cada reproducción actualiza el
+mtime de su índice) hasta quedar bajo SIM_GRABACIONES_MB (1024 por defecto).
+"""
+
+import json
+import os
+import struct
+import time
+import zlib
+from bisect import bisect_right
+from typing import Iterator, List, Optional, Tuple
+
+from core.frames import fusionar_frames
+
+REGISTRO = struct.Struct("<IIB")
+TIPO_KEY = 0
+TIPO_DELTA = 1
+
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def directorio_grabaciones() -> str:
+    return os.environ.get("SIM_GRABACIONES_DIR") or os.path.join(RAIZ_PROYECTO, "grabaciones")
+
+
+def max_bytes_grabaciones() -> int:
+    return int(float(os.environ.get("SIM_GRABACIONES_MB", 1024)) * 1024 * 1024)
+
+
+def _rutas(run_id: str, directorio: Optional[str] = None) -> Tuple[str, str]:
+    # run_id viene de la URL: sin separadores para no salir del directorio
+    if not run_id or os.path.basename(run_id) != run_id or run_id.startswith("."):
+        raise FileNotFoundError(run_id)
+    base = os.path.join(directorio or directorio_grabaciones(), run_id)
+    return base + ".sim", base + ".json"
+
+
+class Grabador:
+    """Escribe los frames de una corrida (uno por tick) y su índice de keyframes."""
+
+    def __init__(self, run_id: str, config: Optional[dict] = None, directorio: Optional[str] = None):
+        directorio = directorio or directorio_grabaciones()
+        os.makedirs(directorio, exist_ok=True)
+        self.run_id = run_id
+        self.ruta_log, self.ruta_indice = _rutas(run_id, directorio)
+        self.indice = {
+            "run_id": run_id,
+            "config": config or {},
+            "creada": time.time(),
+            "terminada": None,
+            "final": False,
+            "tick_inicial": None,
+            "tick_final": None,
+            "frames": 0,
+            "bytes": 0,
+            "keyframes": [],
+        }
+        self._f = open(self.ruta_log, "wb")
+        # (tick, offset) de cada registro, para recortar la grabación
+        self._ticks: List[int] = []
+        self._offsets: List[int] = []
+
+    def escribir(self, tick: int, frame: dict):
+        tipo = TIPO_DELTA if frame.get("frame") == "delta" else TIPO_KEY
+        datos = zlib.compress(json.dumps(frame, separators=(",", ":")).encode(), 6)
+        offset = self._f.tell()
+        self._f.write(REGISTRO.pack(len(datos), tick, tipo))
+        self._f.write(datos)
+        if tipo == TIPO_KEY:
+            self.indice["keyframes"].append([tick, offset])
+        self._ticks.append(tick)
+        self._offsets.append(offset)
+        if self.indice["tick_inicial"] is None:
+            self.indice["tick_inicial"] = tick
+        self.indice["tick_final"] = tick
+        self.indice["frames"] += 1
+        self.indice["final"] = bool(frame.get("final"))
+
+    def truncar(self, tick: int) -> Optional[dict]:
+        """
+        Descarta los registros posteriores a `tick` (la reproducción se detuvo
+        antes que el productor) y retorna el estado completo en ese tick.
+        """
+        k = bisect_right(self._ticks, tick)
+        if k < len(self._ticks):
+            self._f.seek(self._offsets[k])
+            self._f.truncate()
+            del self._ticks[k:], self._offsets[k:]
+            self.indice["keyframes"] = [kf for kf in self.indice["keyframes"] if kf[0] <= tick]
+            self.indice["frames"] = k
+            self.indice["tick_final"] = self._ticks[-1] if self._ticks else None
+            if not self._ticks:
+                self.indice["tick_inicial"] = None
+        if not self.indice["keyframes"]:
+            return None
+        self._f.flush()
+        estado = None
+        with open(self.ruta_log, "rb") as f:
+            f.seek(self.indice["keyframes"][-1][1])
+            while True:
+                registro = _leer_registro(f)
+                if registro is None:
+                    return estado
+                estado = fusionar_frames(estado, json.loads(zlib.decompress(registro[2])))
+
+    def cerrar(self):
+        if self._f.closed:
+            return
+        self.indice["bytes"] = self._f.tell()
+        self.indice["terminada"] = time.time()
+        self._f.close()
+        tmp = self.ruta_indice + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.indice, f, ensure_ascii=False)
+        os.replace(tmp, self.ruta_indice)
+        recortar_grabaciones(os.path.dirname(self.ruta_log), excluir=(self.run_id,))
+
+
+def _leer_registro(f) -> Optional[Tuple[int, int, bytes]]:
+    cabecera = f.read(REGISTRO.size)
+    if len(cabecera) < REGISTRO.size:
+        return None
+    n, tick, tipo = REGISTRO.unpack(cabecera)
+    datos = f.read(n)
+    if len(datos) < n:
+        return None  # registro a medio escribir
+    return tick, tipo, datos
+
+
+class LectorGrabacion:
+    """Acceso a una grabación: recorrerla desde cualquier tick."""
+
+    def __init__(self, run_id: str, directorio: Optional[str] = None):
+        self.run_id = run_id
+        self.ruta_log, self.ruta_indice = _rutas(run_id, directorio)
+        if not os.path.exists(self.ruta_log):
+            raise FileNotFoundError(self.ruta_log)
+        try:
+            with open(self.ruta_indice, "r", encoding="utf-8") as f:
+                self.indice = json.load(f)
+            os.utime(self.ruta_indice)  # recién usada (ver recortar_grabaciones)
+        except (OSError, ValueError):
+            self.indice = self._reconstruir_indice()
+        self._ticks_key = [t for t, _ in self.indice["keyframes"]]
+
+    def _reconstruir_indice(self) -> dict:
+        """Índice de una grabación sin cerrar: recorre solo las cabeceras."""
+        indice = {"run_id": self.run_id, "config": {}, "creada": os.path.getmtime(self.ruta_log),
+                  "terminada": None, "final": False, "tick_inicial": None, "tick_final": None,
+                  "frames": 0, "bytes": 0, "keyframes": []}
+        tamano = os.path.getsize(self.ruta_log)
+        with open(self.ruta_log, "rb") as f:
+            while True:
+                offset = f.tell()
+                cabecera = f.read(REGISTRO.size)
+                if len(cabecera) < REGISTRO.size:
+                    break
+                n, tick, tipo = REGISTRO.unpack(cabecera)
+                f.seek(n, os.SEEK_CUR)
+                if f.tell() > tamano:
+                    break
+                if tipo == TIPO_KEY:
+                    indice["keyframes"].append([tick, offset])
+                if indice["tick_inicial"] is None:
+                    indice["tick_inicial"] = tick
+                indice["tick_final"] = tick
+                indice["frames"] += 1
+                indice["bytes"] = f.tell()
+        return indice
+
+    def resumen(self) -> dict:
+        return {k: v for k, v in self.indice.items() if k != "keyframes"}
+
+    def frames(self, desde: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Itera (tick, frame JSON) desde el tick `desde` (o desde el inicio).
+        Con `desde` el primer frame es un keyframe con el estado en ese tick
+        (o en el último tick grabado antes de él).
+        """
+        keyframes = self.indice["keyframes"]
+        if not keyframes:
+            return
+        k = 0 if desde is None else max(0, bisect_right(self._ticks_key, desde) - 1)
+        with open(self.ruta_log, "rb") as f:
+            f.seek(keyframes[k][1])
+            if desde is not None:
+                # fusionar desde el keyframe hasta el tick pedido
+                estado, tick_estado = None, keyframes[k][0]
+                while True:
+                    offset = f.tell()
+                    registro = _leer_registro(f)
+                    if registro is None or (estado is not None and registro[0] > desde):
+                        f.seek(offset)
+                        break
+                    tick_estado = registro[0]
+                    estado = fusionar_frames(estado, json.loads(zlib.decompress(registro[2])))
+                estado["frame"] = "key"
+                yield tick_estado, json.dumps(estado)
+            while True:
+                registro = _leer_registro(f)
+                if registro is None:
+                    return
+                yield registro[0], zlib.decompress(registro[2]).decode()
+
+
+def listar_grabaciones(directorio: Optional[str] = None) -> List[dict]:
+    """Resúmenes de las grabaciones del directorio, de la más reciente a la más antigua."""
+    directorio = directorio or directorio_grabaciones()
+    if not os.path.isdir(directorio):
+        return []
+    salida = []
+    for nombre in os.listdir(directorio):
+        if nombre.endswith(".sim"):
+            try:
+                salida.append(LectorGrabacion(nombre[:-4], directorio).resumen())
+            except (OSError, ValueError):
+                continue
+    return sorted(salida, key=lambda r: r["creada"] or 0, reverse=True)
+
+
+def recortar_grabaciones(directorio: Optional[str] = None, max_bytes: Optional[int] = None,
+                         excluir: Tuple[str, ...] = ()):
+    """
+    Borra las grabaciones menos usadas hasta quedar bajo max_bytes. Las que
+    no tienen índice y se modificaron hace menos de una hora se consideran en
+    curso y no se tocan; tampoco las de `excluir`.
+    """
+    directorio = directorio or directorio_grabaciones()
+    max_bytes = max_bytes_grabaciones() if max_bytes is None else max_bytes
+    if not os.path.isdir(directorio):
+        return
+    limite = time.time() - 3600
+    entradas, total = [], 0
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith(".sim"):
+            continue
+        run_id = nombre[:-4]
+        ruta_log, ruta_indice = _rutas(run_id, directorio)
+        try:
+            bytes_ = os.path.getsize(ruta_log)
+            if os.path.exists(ruta_indice):
+                bytes_ += os.path.getsize(ruta_indice)
+                usado = os.path.getmtime(ruta_indice)
+            else:
+                usado = os.path.getmtime(ruta_log)
+                if usado > limite:
+                    run_id = None  # en curso
+        except OSError:
+            continue
+        total += bytes_
+        if run_id is not None and run_id not in excluir:
+            entradas.append((usado, bytes_, ruta_log, ruta_indice))
+    for usado, bytes_, ruta_log, ruta_indice in sorted(entradas):
+        if total <= max_bytes:
+            break
+        for ruta in (ruta_log, ruta_indice):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        total -= bytes_
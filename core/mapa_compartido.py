@@ -0,0 +1,169 @@
+"""
+Publicación de las partes estáticas de un StoreMap en multiprocessing.shared_memory.
+
+Los workers de un pool se adjuntan al bloque compartido sin copiarlo ni
+deserializarlo: tipos de celda, capacidades, direcciones de estanterías,
+productos y la tabla de distancias desde cada caja son vistas numpy sobre
+la misma memoria. La disposición se decodifica una sola vez por worker; cada
+réplica solo crea sus celdas (estado mutable: clientes y colas) y usa la
+tabla de distancias directamente sobre la memoria compartida, sin copiarla
+(StoreMap.find_best_checkout la consulta si el escenario pide
+distancia_caminando).
+"""
+
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+import numpy as np
+
+from core.store_map import StoreMap
+from entities.cell import Cell, CellType, Direction
+
+TIPOS = list(CellType)
+DIRECCIONES = [None] + list(Direction)
+
+
+def _arreglos_estaticos(store_map: StoreMap):
+    rows, cols = store_map.rows, store_map.cols
+    categorias: List[str] = []
+    tipos = np.zeros((rows, cols), dtype=np.int8)
+    capacidades = np.zeros((rows, cols), dtype=np.int16)
+    direcciones = np.zeros((rows, cols), dtype=np.int8)
+    productos = np.full((rows, cols), -1, dtype=np.int32)
+    cat_idx = np.full((rows, cols), -1, dtype=np.int16)
+    for i in range(rows):
+        for j in range(cols):
+            cell = store_map.grid[i][j]
+            tipos[i, j] = TIPOS.index(cell.type)
+            capacidades[i, j] = cell.capacity
+            direcciones[i, j] = DIRECCIONES.index(cell.direction)
+            if cell.product_id is not None:
+                productos[i, j] = cell.product_id
+            if cell.category is not None:
+                if cell.category not in categorias:
+                    categorias.append(cell.category)
+                cat_idx[i, j] = categorias.index(cell.category)
+    _, distancias = store_map.checkout_distances()
+    arreglos = {
+        "tipos": tipos, "capacidades": capacidades, "direcciones": direcciones,
+        "productos": productos, "categorias": cat_idx,
+        "posiciones_cajas": store_map.posiciones_cajas,
+        "distancias_cajas": distancias,
+    }
+    return arreglos, categorias
+
+
+class MapaPublicado:
+    """
+    Bloque de memoria compartida con las partes estáticas de un mapa.
+    `handle` es un dict pequeño y picklable para enviar a los workers.
+    """
+
+    def __init__(self, store_map: StoreMap):
+        arreglos, categorias = _arreglos_estaticos(store_map)
+        campos: Dict[str, tuple] = {}
+        offset = 0
+        for nombre, arr in arreglos.items():
+            offset = (offset + 7) // 8 * 8  # alinear a 8 bytes
+            campos[nombre] = (offset, arr.dtype.str, arr.shape)
+            offset += arr.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for nombre, arr in arreglos.items():
+            off, dtype, shape = campos[nombre]
+            np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=off)[...] = arr
+        self.handle = {
+            "nombre": self.shm.name,
+            "rows": store_map.rows,
+            "cols": store_map.cols,
+            "campos": campos,
+            "categorias": categorias,
+            "symbol_config": store_map.symbol_config,
+            "walking_distance": store_map.walking_distance,
+        }
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def publicar_mapa(store_map: StoreMap) -> MapaPublicado:
+    """Publica las partes estáticas del mapa; el llamador debe cerrar el resultado."""
+    return MapaPublicado(store_map)
+
+
+def _abrir(nombre: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=nombre, track=False)
+    except TypeError:
+        # Python < 3.13: los workers del pool comparten el resource_tracker del
+        # publicador, así que registrar el bloque otra vez no tiene efecto
+        return shared_memory.SharedMemory(name=nombre)
+
+
+class VistaMapa:
+    """Vistas numpy (sin copia) sobre un mapa publicado."""
+
+    def __init__(self, handle: dict):
+        self.handle = handle
+        self.shm = _abrir(handle["nombre"])
+        self.arreglos = {
+            nombre: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=off)
+            for nombre, (off, dtype, shape) in handle["campos"].items()
+        }
+        self._plantilla = None
+
+    def _disposicion(self) -> List[List[tuple]]:
+        """(tipo, capacidad, dirección, producto, categoría) por celda; se decodifica una vez."""
+        if self._plantilla is None:
+            a = self.arreglos
+            categorias = self.handle["categorias"]
+            self._plantilla = [
+                [(TIPOS[t], cap, DIRECCIONES[d], p if p >= 0 else None, categorias[c] if c >= 0 else None)
+                 for t, cap, d, p, c in zip(*(a[n][i].tolist() for n in
+                                              ("tipos", "capacidades", "direcciones", "productos", "categorias")))]
+                for i in range(self.handle["rows"])
+            ]
+        return self._plantilla
+
+    def construir_mapa(self) -> StoreMap:
+        """StoreMap nuevo (celdas y colas vacías) a partir de las vistas compartidas."""
+        h = self.handle
+        sm = StoreMap.__new__(StoreMap)
+        sm.symbol_config = h["symbol_config"]
+        sm._queue_listeners = []
+        sm.walking_distance = h["walking_distance"]
+        sm.rows, sm.cols = h["rows"], h["cols"]
+        sm.grid = []
+        for i, fila in enumerate(self._disposicion()):
+            row = []
+            for j, (tipo, capacidad, direccion, producto, categoria) in enumerate(fila):
+                cell = Cell(tipo, i, j)
+                # se copia tal cual: build_store cambia el tipo de celdas ya creadas
+                # y conservan la capacidad de pasillo, que el constructor no respetaría
+                cell.capacity = capacidad
+                cell.direction = direccion
+                cell.product_id = producto
+                cell.category = categoria
+                row.append(cell)
+            sm.grid.append(row)
+        # vistas sobre la memoria compartida, sin copia
+        sm.distancias_cajas = self.arreglos["distancias_cajas"]
+        sm.posiciones_cajas = self.arreglos["posiciones_cajas"]
+        sm._indice_cajas = None
+        return sm
+
+    def close(self):
+        self.arreglos = {}
+        self._plantilla = None
+        self.shm.close()
+
+
+def adjuntar_mapa(handle: dict) -> VistaMapa:
+    """Se adjunta a un mapa publicado por otro proceso."""
+    return VistaMapa(handle)
@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional
+import numpy as np
+
+from core.store_map import StoreMap
+from entities.client import Client, ClientPool
+from core.distribuciones import (
+    calc_client_types,
+    calc_speeds,
+    calc_paciencias,
+    calc_list_sizes,
+)
+
+
+class FabricaClientes:
+    """
+    Crea clientes a partir de atributos muestreados en bloque (tipo, velocidad,
+    paciencia y lista de compras) en lugar de una llamada por cliente.
+
+    Se puede usar como fábrica perezosa: fabrica(hora) -> Client, por ejemplo
+    con Simulation.schedule_arrival_stream. Si se entrega un ClientPool, las
+    instancias se reutilizan entre réplicas.
+    """
+
+    def __init__(self, dia: str, store_map: StoreMap, pool: Optional[ClientPool] = None,
+                 rng: np.random.Generator = None, bloque: int = 64,
+                 rng_listas: np.random.Generator = None):
+        self.dia = dia
+        self.pool = pool if pool is not None else ClientPool()
+        self.rng = rng
+        # flujo separado para las listas de compras (por defecto el mismo rng)
+        self.rng_listas = rng_listas if rng_listas is not None else rng
+        self.bloque = bloque
+        # el catálogo no cambia durante la simulación: se lee una sola vez
+        self.products = store_map.get_products()
+        self._pendientes: Dict[int, List[tuple]] = {}  # hora -> atributos ya muestreados
+
+    def _muestrear(self, n: int, hora: int) -> List[tuple]:
+        """
+        Muestrea n juegos de atributos (patience, tipo, velocidad, picks) de forma vectorizada.
+        """
+        tipos = calc_client_types(self.dia, hora, n, rng=self.rng)
+        velocidades = calc_speeds(self.dia, hora, tipos, rng=self.rng)
+        paciencias = calc_paciencias(n, rng=self.rng)
+
+        num_products = len(self.products)
+        if num_products == 0:
+            picks = [[] for _ in range(n)]
+        else:
+            gen = self.rng_listas if self.rng_listas is not None else np.random
+            sizes = np.minimum(calc_list_sizes(tipos, rng=self.rng_listas), num_products)
+            kmax = int(sizes.max()) if n else 0
+            # muestreo sin reemplazo: los kmax menores de claves uniformes por fila, en orden aleatorio
+            keys = gen.random((n, num_products))
+            if kmax < num_products:
+                part = np.argpartition(keys, kmax - 1, axis=1)[:, :kmax]
+            else:
+                part = np.tile(np.arange(num_products), (n, 1))
+            order = np.take_along_axis(keys, part, axis=1).argsort(axis=1)
+            idx = np.take_along_axis(part, order, axis=1)
+            picks = [[self.products[j] for j in idx[i, :sizes[i]]] for i in range(n)]
+
+        return list(zip(paciencias.tolist(), tipos.tolist(), velocidades.tolist(), picks))
+
+    def _construir(self, atributos: tuple) -> Client:
+        patience, tipo, velocidad, picks = atributos
+        client = self.pool.acquire(patience=patience, tipo=tipo, velocidad=velocidad)
+        client.set_list(picks)
+        return client
+
+    def crear(self, n: int, hora: int) -> List[Client]:
+        """Crea n clientes para la hora dada."""
+        return [self._construir(a) for a in self._muestrear(n, hora)]
+
+    def __call__(self, hora: int) -> Client:
+        pendientes = self._pendientes.get(hora)
+        if not pendientes:
+            pendientes = self._muestrear(self.bloque, hora)
+            pendientes.reverse()
+            self._pendientes[hora] = pendientes
+        return self._construir(pendientes.pop())
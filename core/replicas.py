@@ -0,0 +1,169 @@
+"""
+Réplicas Monte Carlo de un escenario en paralelo.
+
+Cada réplica es una corrida independiente de ejecutar_escenario con su
+propia semilla (derivada con numpy SeedSequence para que no se solapen).
+Los resultados se agregan en medias e intervalos de confianza t-Student.
+Con compartir_mapa=True el mapa se construye una sola vez y los workers lo
+leen desde memoria compartida (core.mapa_compartido).
+"""
+
+import contextlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy.stats import t as t_student
+
+from core.escenario import ejecutar_escenario, normalizar_escenario, construir_mapa
+from core.flujos import Flujos
+from core.mapa_compartido import publicar_mapa, adjuntar_mapa, VistaMapa
+from entities.client import ClientPool
+
+KPIS = ("espera_media", "tiempo_total_medio", "cola_media", "utilizacion_media")
+
+# pool de clientes por proceso worker, reutilizado entre réplicas
+_pool_worker: Optional[ClientPool] = None
+# vista del mapa publicado por el proceso principal (si se comparte)
+_vista_worker: Optional[VistaMapa] = None
+
+
+def semillas_replicas(semilla: Optional[int], n: int) -> List[int]:
+    """Deriva n semillas independientes a partir de una semilla maestra."""
+    hijos = np.random.SeedSequence(semilla).spawn(n)
+    return [int(h.generate_state(1, dtype=np.uint64)[0]) for h in hijos]
+
+
+def _inicializar_worker(handle: Optional[dict]):
+    global _vista_worker
+    _vista_worker = adjuntar_mapa(handle) if handle is not None else None
+
+
+@contextlib.contextmanager
+def _ejecutor(escenario: dict, workers: int, compartir_mapa: bool):
+    """ProcessPoolExecutor cuyos workers se adjuntan al mapa compartido del escenario."""
+    with contextlib.ExitStack() as pila:
+        handle = None
+        if compartir_mapa:
+            handle = pila.enter_context(publicar_mapa(construir_mapa(escenario))).handle
+        yield pila.enter_context(ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker,
+                                                     initargs=(handle,)))
+
+
+def ejecutar_replica(escenario: dict, semilla: int, antitetico: Optional[bool] = None) -> dict:
+    """
+    Corre una réplica en el proceso actual (usado como tarea del pool).
+    Si antitetico no es None, la réplica usa flujos dedicados (core.flujos),
+    antitéticos cuando antitetico=True.
+    """
+    global _pool_worker
+    if _pool_worker is None:
+        _pool_worker = ClientPool()
+    flujos = Flujos(semilla, antitetico) if antitetico is not None else None
+    store_map = _vista_worker.construir_mapa() if _vista_worker is not None else None
+    resultado = ejecutar_escenario(escenario, semilla, pool=_pool_worker, flujos=flujos, store_map=store_map)
+    resultado["semilla"] = semilla
+    resultado["antitetico"] = antitetico
+    return resultado
+
+
+def intervalo_confianza(valores, confianza: float = 0.95) -> Dict[str, float]:
+    """Media, desviación e intervalo de confianza t-Student (ignora NaN)."""
+    x = np.asarray(valores, dtype=float)
+    x = x[np.isfinite(x)]
+    n = x.size
+    if n == 0:
+        return {"n": 0, "media": float("nan"), "desv": float("nan"),
+                "ic_inf": float("nan"), "ic_sup": float("nan"), "semiancho": float("nan")}
+    media = float(x.mean())
+    desv = float(x.std(ddof=1)) if n > 1 else 0.0
+    semiancho = float(t_student.ppf((1 + confianza) / 2, n - 1) * desv / np.sqrt(n)) if n > 1 else float("inf")
+    return {"n": n, "media": media, "desv": desv,
+            "ic_inf": media - semiancho, "ic_sup": media + semiancho, "semiancho": semiancho}
+
+
+def resumir_replicas(resultados: List[dict], kpis=KPIS, confianza: float = 0.95) -> Dict[str, dict]:
+    """Agrega los KPIs de varias réplicas."""
+    return {k: intervalo_confianza([r[k] for r in resultados], confianza) for k in kpis}
+
+
+def ejecutar_replicas(escenario: dict, n: int, semilla: Optional[int] = None,
+                      workers: Optional[int] = None, confianza: float = 0.95,
+                      compartir_mapa: bool = True) -> dict:
+    """
+    Ejecuta n réplicas independientes del escenario en un ProcessPoolExecutor
+    (por defecto con todos los núcleos) y retorna los KPIs agregados.
+    """
+    escenario = normalizar_escenario(escenario)
+    semillas = semillas_replicas(semilla, n)
+    workers = workers or os.cpu_count()
+    with _ejecutor(escenario, workers, compartir_mapa) as ex:
+        resultados = list(ex.map(ejecutar_replica, [escenario] * n, semillas))
+    return {
+        "escenario": escenario,
+        "semilla": semilla,
+        "replicas": n,
+        "confianza": confianza,
+        "kpis": resumir_replicas(resultados, confianza=confianza),
+        "resultados": resultados,
+    }
+
+
+def ejecutar_hasta_precision(escenario: dict, objetivo: Dict[str, float], relativo: bool = False,
+                             lote: Optional[int] = None, min_replicas: int = 5, max_replicas: int = 200,
+                             max_segundos: Optional[float] = None, semilla: Optional[int] = None,
+                             workers: Optional[int] = None, confianza: float = 0.95,
+                             compartir_mapa: bool = True) -> dict:
+    """
+    Regla de parada secuencial: lanza lotes de réplicas hasta que el semiancho
+    del intervalo de confianza de cada KPI en `objetivo` sea menor que su meta
+    (absoluta, o relativa a la media si relativo=True), o hasta agotar el
+    presupuesto (max_replicas o max_segundos).
+    """
+    escenario = normalizar_escenario(escenario)
+    workers = workers or os.cpu_count()
+    lote = lote or workers
+    kpis = tuple(dict.fromkeys(list(KPIS) + list(objetivo)))
+    secuencia = np.random.SeedSequence(semilla)
+    resultados: List[dict] = []
+    lotes = 0
+    inicio = time.time()
+    motivo = "presupuesto"
+
+    def cumple(resumen):
+        for kpi, meta in objetivo.items():
+            r = resumen[kpi]
+            semiancho = r["semiancho"] / abs(r["media"]) if relativo and r["media"] else r["semiancho"]
+            if not np.isfinite(semiancho) or semiancho > meta:
+                return False
+        return True
+
+    with _ejecutor(escenario, workers, compartir_mapa) as ex:
+        while len(resultados) < max_replicas:
+            n = min(max(lote, min_replicas - len(resultados)), max_replicas - len(resultados))
+            semillas = [int(h.generate_state(1, dtype=np.uint64)[0]) for h in secuencia.spawn(n)]
+            resultados.extend(ex.map(ejecutar_replica, [escenario] * n, semillas))
+            lotes += 1
+            resumen = resumir_replicas(resultados, kpis, confianza)
+            if len(resultados) >= min_replicas and cumple(resumen):
+                motivo = "precision"
+                break
+            if max_segundos is not None and time.time() - inicio >= max_segundos:
+                break
+
+    return {
+        "escenario": escenario,
+        "semilla": semilla,
+        "replicas": len(resultados),
+        "lotes": lotes,
+        "convergio": motivo == "precision",
+        "motivo": motivo,
+        "objetivo": objetivo,
+        "relativo": relativo,
+        "confianza": confianza,
+        "segundos": time.time() - inicio,
+        "kpis": resumir_replicas(resultados, kpis, confianza),
+        "resultados": resultados,
+    }
@@ -0,0 +1,143 @@
+"""
+Salas de simulación: una sesión en curso difundida a varios espectadores.
+
+Los frames llegan del worker ya codificados (str JSON o bytes) y se
+encolan tal cual en cada suscriptor, así que cada frame se serializa una
+sola vez sin importar cuántos lo miren. El suscriptor principal (quien
+abrió la sesión) marca el ritmo: su cola es corta y publicar espera a que
+haya espacio, igual que antes de las salas. Los espectadores no frenan a
+nadie: si su cola se llena se vacía y se reemplaza por el estado de
+arranque (resincronización).
+
+El estado de arranque es lo mínimo para reconstruir el estado actual:
+la confirmación de formato, el último keyframe con los deltas posteriores
+ya fusionados (fusionar_frames, codificado una vez y reutilizado hasta el
+próximo frame), las últimas métricas y el último frame binario. Es lo que
+recibe quien se une tarde.
+"""
+
+import asyncio
+import json
+from typing import List, Optional, Union
+
+from core.frames import fusionar_frames
+
+Payload = Union[str, bytes]
+
+FRAMES_EN_VUELO = 2
+MAX_COLA_ESPECTADOR = 32
+
+
+class Suscriptor:
+    """Cola de frames codificados hacia un socket."""
+
+    def __init__(self, maxsize: int):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.resincronizaciones = 0
+
+    async def get(self) -> Optional[Payload]:
+        return await self.cola.get()
+
+    def _vaciar(self):
+        while not self.cola.empty():
+            self.cola.get_nowait()
+
+    def cerrar(self):
+        """Termina el envío: el próximo get retorna None."""
+        self._vaciar()
+        self.cola.put_nowait(None)
+
+
+class Sala:
+    """Difunde los frames de una sesión. Sus métodos se llaman desde el event loop."""
+
+    def __init__(self, en_vuelo: int = FRAMES_EN_VUELO, max_cola: int = MAX_COLA_ESPECTADOR):
+        self.principal = Suscriptor(en_vuelo)
+        self.espectadores: List[Suscriptor] = []
+        self.max_cola = max_cola
+        self.cerrada = False
+        self.frames_publicados = 0
+        # estado de arranque
+        self._formato: Optional[Payload] = None
+        self._key: Optional[Payload] = None
+        self._deltas: List[Payload] = []
+        self._metricas: Optional[Payload] = None
+        self._binario: Optional[Payload] = None
+        self._arranque: Optional[List[Payload]] = None
+
+    def _registrar(self, payload: Payload, tipo: Optional[str]):
+        if tipo == "key":
+            self._key, self._deltas = payload, []
+        elif tipo == "delta":
+            self._deltas.append(payload)
+        elif tipo == "metricas":
+            self._metricas = payload
+        elif tipo == "binario":
+            self._binario = payload
+        elif tipo == "formato":
+            self._formato = payload
+        else:
+            return
+        self._arranque = None
+
+    def arranque(self) -> List[Payload]:
+        """Frames que reconstruyen el estado actual (en orden de aplicación)."""
+        if self._arranque is None:
+            salida = [self._formato] if self._formato is not None else []
+            if self._key is not None:
+                if self._deltas:
+                    estado = json.loads(self._key)
+                    for delta in self._deltas:
+                        estado = fusionar_frames(estado, json.loads(delta))
+                    estado["frame"] = "key"
+                    self._key, self._deltas = json.dumps(estado), []
+                salida.append(self._key)
+            salida += [p for p in (self._metricas, self._binario) if p is not None]
+            self._arranque = salida
+        return self._arranque
+
+    def unirse(self) -> Suscriptor:
+        """Nuevo espectador; recibe de inmediato el estado de arranque."""
+        espectador = Suscriptor(self.max_cola)
+        if self.cerrada:
+            espectador.cerrar()
+            return espectador
+        for payload in self.arranque():
+            espectador.cola.put_nowait(payload)
+        self.espectadores.append(espectador)
+        return espectador
+
+    def salir(self, espectador: Suscriptor):
+        if espectador in self.espectadores:
+            self.espectadores.remove(espectador)
+        espectador.cerrar()
+
+    def _resincronizar(self, espectador: Suscriptor):
+        espectador._vaciar()
+        for payload in self.arranque():
+            espectador.cola.put_nowait(payload)
+        espectador.resincronizaciones += 1
+
+    async def publicar(self, payload: Payload, tipo: Optional[str] = None):
+        """Envía el frame a todos; espera solo por el suscriptor principal."""
+        self._registrar(payload, tipo)
+        self.frames_publicados += 1
+        for espectador in self.espectadores:
+            try:
+                espectador.cola.put_nowait(payload)
+            except asyncio.QueueFull:
+                # el arranque ya incluye este frame
+                self._resincronizar(espectador)
+        await self.principal.cola.put(payload)
+
+    async def cerrar(self):
+        """Fin de la sesión: los espectadores terminan después de sus frames pendientes."""
+        self.cerrada = True
+        for espectador in self.espectadores:
+            try:
+                espectador.cola.put_nowait(None)
+            except asyncio.QueueFull:
+                self._resincronizar(espectador)
+                espectador.cola.put_nowait(None)
+        self.espectadores = []
+        await self.principal.cola.put(None)
@@ -0,0 +1,435 @@
+"""
+Sesión de simulación del WebSocket, ejecutada fuera del event loop.
+
+SesionSimulacion arma la simulación a partir de la configuración que envía
+el navegador y corre el ciclo de ticks (ejecutar). Cada frame listo (dict
+JSON o bytes en modo binario, ver codificar_payload) se entrega con
+`emitir`; los comandos del navegador (pause, resume, step, stop,
+set_speed) llegan por una queue.Queue.
+
+La simulación corre adelantada: un hilo productor calcula ticks y los
+codifica en un BufferAdelanto acotado (buffer_ticks frames), y el hilo de
+ejecutar los reproduce a ritmo de tick_delay. Así la velocidad de
+reproducción no depende del costo de cada tick mientras el buffer tenga
+frames. pause, step y set_speed actúan sobre la reproducción: en pausa el
+productor sigue hasta llenar el buffer y step entrega el siguiente frame ya
+calculado.
+
+stop detiene la reproducción en el tick mostrado: el frame final, la
+grabación y las gráficas corresponden a ese tick aunque el productor haya
+calculado ticks de más (que se descartan).
+
+Con grabar=True (y un run_id en la configuración) el productor además
+escribe cada tick como keyframe o delta en una grabación (core.grabacion)
+que luego se puede reproducir sin volver a simular.
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional, Tuple, Union
+
+from core.escenario import build_store
+from core.simulation import Simulation
+from core.poblacion import FabricaClientes
+from core.eventos import registro, DEBUG
+from core.grabacion import Grabador
+from core.frames import (
+    CodificadorDeltas,
+    estado_completo,
+    codificar_binario,
+    decodificar_binario,
+    fusionar_frames,
+    marcar_final_binario,
+    metricas_frame,
+    VERSION_BINARIA,
+)
+from core.distribuciones import (
+    clientes_por_hora,
+    intervalo_entre_clientes,
+    HORA_APERTURA,
+    HORA_CIERRE,
+    TICKS_POR_HORA,
+)
+from entities.client import Client
+
+Frame = Union[dict, bytes]
+
+FRAMES_ADELANTE = 64
+
+
+class BufferAdelanto:
+    """Cola acotada de ticks ya calculados: (tick, frames) del productor al reproductor."""
+
+    def __init__(self, capacidad: int = FRAMES_ADELANTE):
+        self.capacidad = capacidad
+        self._ticks: deque = deque()
+        self._cond = threading.Condition()
+        self._fin = False
+        self._cancelado = False
+        self.error: Optional[BaseException] = None
+
+    def __len__(self) -> int:
+        return len(self._ticks)
+
+    def poner(self, tick: int, frames: List[Frame]) -> bool:
+        """Bloquea mientras el buffer esté lleno; False si la reproducción se canceló."""
+        with self._cond:
+            while len(self._ticks) >= self.capacidad and not self._cancelado:
+                self._cond.wait()
+            if self._cancelado:
+                return False
+            self._ticks.append((tick, frames))
+            self._cond.notify_all()
+            return True
+
+    def tomar(self, timeout: Optional[float] = None) -> Optional[Tuple[int, List[Frame]]]:
+        """
+        Siguiente tick calculado. Retorna (tick, []) si no hubo uno dentro de
+        `timeout` y None cuando el productor terminó y no quedan ticks.
+        """
+        with self._cond:
+            if not self._ticks and not self._fin:
+                self._cond.wait(timeout)
+            if self._ticks:
+                item = self._ticks.popleft()
+                self._cond.notify_all()
+                return item
+            return None if self._fin else (-1, [])
+
+    def terminar(self, error: Optional[BaseException] = None):
+        """Fin de la producción (o error del productor)."""
+        with self._cond:
+            self._fin = True
+            self.error = error
+            self._cond.notify_all()
+
+    def cancelar(self):
+        """Libera al productor si quedó bloqueado esperando espacio."""
+        with self._cond:
+            self._cancelado = True
+            self._cond.notify_all()
+
+
+class SesionSimulacion:
+    """Estado y ciclo de una simulación interactiva."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.dia = config.get('day', 'lunes')
+        self.hora = config.get('hour', 10)
+
+        # Crear simulación
+        rows = config.get('rows', 10)
+        cols = config.get('cols', 12)
+        store = build_store(rows=rows, cols=cols)
+        store.walking_distance = bool(config.get('distancia_caminando', False))
+        # Tiempos de paso precalculados por ruta (misma distribución, menos llamadas al RNG)
+        self.sim = sim = Simulation(store, precompute_delays=bool(config.get('precompute_delays', False)))
+
+        # RESETEAR CONTADOR DE IDs ANTES DE CREAR CLIENTES
+        Client._id_counter = 0
+
+        # Día completo: llegadas perezosas desde el generador no homogéneo
+        full_day = bool(config.get('full_day', False))
+        if full_day:
+            sim.schedule_day(self.dia)
+
+        # Determinar cuántos clientes crear
+        clients_num = 0 if full_day else clientes_por_hora(self.dia, self.hora)
+        print(f"👥 Se crearán {clients_num} clientes")
+
+        arrival_tick = 0
+        self.pending_clients: List[Client] = []
+        fabrica = FabricaClientes(self.dia, store)
+        for client in fabrica.crear(clients_num, self.hora):
+            # Programar llegada
+            arrival_tick += intervalo_entre_clientes(lmbda=3)
+            client.entry_tick = arrival_tick
+            self.pending_clients.append(client)  # lista temporal, NO sim.clients
+            if registro.nivel <= DEBUG:
+                registro.emitir(DEBUG, "cliente.creado", cliente=client.id, tipo=client.tipo,
+                                items=client.items_total, entrada_tick=arrival_tick)
+
+        print(f"📊 Total de clientes programados: {len(self.pending_clients)}")
+        if registro.nivel <= DEBUG:
+            registro.emitir(DEBUG, "llegadas.ticks", ticks=[c.entry_tick for c in self.pending_clients])
+
+        # Valores de control
+        self.max_ticks = config.get('max_ticks', 100)
+        if full_day:
+            self.max_ticks = max(self.max_ticks, (HORA_CIERRE - HORA_APERTURA) * TICKS_POR_HORA)
+        self.tick_delay = config.get('tick_delay', 0.5)
+        self.paused = False
+        self.stopped = False
+
+        # Cálculo adelantado: ticks listos para reproducir y pasos pedidos con step
+        self.buffer_ticks = max(1, int(config.get('buffer_ticks', FRAMES_ADELANTE)))
+        self.buffer: Optional[BufferAdelanto] = None
+        self.tick_mostrado = 0
+        self._pasos = 0
+        # lo último reproducido: frames JSON desde el último keyframe, o el último binario y métricas
+        self._mostrados: List[dict] = []
+        self._binario_mostrado: Optional[bytes] = None
+        self._metricas_mostradas: Optional[dict] = None
+
+        # Frames delta: keyframe cada N ticks y solo los cambios entre ellos
+        self.keyframe_every = max(1, int(config.get('keyframe_every', 50)))
+        self.codificador = CodificadorDeltas(self.keyframe_every) if config.get('delta') else None
+        # Formato binario negociado: el cliente lo pide y el servidor lo confirma
+        self.binario = config.get('formato') == 'binario'
+        self.frame_seq = 0
+
+        # Grabación: reutiliza los frames delta de la sesión si los hay, si no codifica aparte
+        self.grabador: Optional[Grabador] = None
+        self._codificador_grabacion: Optional[CodificadorDeltas] = None
+        if config.get('grabar') and config.get('run_id'):
+            self.grabador = Grabador(config['run_id'], config={k: v for k, v in config.items() if k != 'clients'})
+            if self.codificador is None or self.binario:
+                self._codificador_grabacion = CodificadorDeltas(self.keyframe_every)
+
+    def mensajes_iniciales(self) -> List[Frame]:
+        """Mensajes previos al primer tick (confirmación del formato binario y celdas estáticas)."""
+        if not self.binario:
+            return []
+        return [
+            {"frame": "formato", "formato": "binario", "version": VERSION_BINARIA},
+            dict(estado_completo(self.sim), frame="key", seq=0, estatico=True),
+        ]
+
+    def frames(self) -> List[Frame]:
+        """Frames del tick actual en el formato negociado."""
+        sim = self.sim
+        if self.binario:
+            salida = [codificar_binario(sim, self.frame_seq)]
+            # métricas por cliente y mapa de consola viajan en JSON cada keyframe_every frames
+            if self.frame_seq % self.keyframe_every == 0:
+                salida.append(metricas_frame(sim, self.frame_seq))
+        elif self.codificador is not None:
+            salida = [self.codificador.codificar(sim)]
+        else:
+            salida = [estado_completo(sim)]
+        self.frame_seq += 1
+        return salida
+
+    def adelantada(self) -> bool:
+        """True si el productor calculó ticks que no se llegaron a mostrar (stop)."""
+        mostrado = self._binario_mostrado is not None if self.binario else bool(self._mostrados)
+        return mostrado and self.sim.tick > self.tick_mostrado
+
+    def _recordar(self, frames: List[Frame]):
+        for frame in frames:
+            if isinstance(frame, (bytes, bytearray)):
+                self._binario_mostrado = frame
+            elif frame.get("frame") == "metricas":
+                self._metricas_mostradas = frame
+            elif frame.get("frame", "key") == "key":
+                self._mostrados = [frame]
+            else:
+                self._mostrados.append(frame)
+
+    def _estado_mostrado(self) -> dict:
+        """Estado completo en el tick mostrado, a partir de los frames JSON reproducidos."""
+        estado = json.loads(json.dumps(self._mostrados[0]))  # copia: los deltas se aplican en el lugar
+        for frame in self._mostrados[1:]:
+            estado = fusionar_frames(estado, frame)
+        estado["frame"] = "key"
+        return estado
+
+    def estado_final(self) -> Frame:
+        """
+        Frame final. Si se detuvo con el productor adelantado es el estado del
+        tick mostrado (en binario, el último frame binario marcado como final)
+        y la grabación se recorta a ese tick.
+        """
+        adelantada = self.adelantada()
+        if not adelantada:
+            final_state = self.codificador.keyframe(self.sim) if self.codificador is not None else estado_completo(self.sim)
+        elif self.binario:
+            final_state = marcar_final_binario(self._binario_mostrado)
+        else:
+            final_state = self._estado_mostrado()
+        if isinstance(final_state, dict):
+            final_state['final'] = True
+        if self.grabador is not None:
+            if adelantada:
+                grabado = self.grabador.truncar(self.tick_mostrado)
+                tick = self.tick_mostrado
+            else:
+                grabado, tick = final_state, self.sim.tick
+            if grabado is not None:
+                self.grabador.escribir(tick, dict(grabado, frame="key", final=True))
+            self.cerrar()
+        return final_state
+
+    def _grabar(self, frames: List[Frame]):
+        if self._codificador_grabacion is not None:
+            frame = self._codificador_grabacion.codificar(self.sim)
+        else:
+            frame = frames[0]
+        self.grabador.escribir(self.sim.tick, frame)
+
+    def cerrar(self):
+        """Cierra la grabación (si la hay); se puede llamar más de una vez."""
+        if self.grabador is not None:
+            self.grabador.cerrar()
+
+    def comando(self, cmd: dict):
+        """Aplica un comando del navegador (sobre la reproducción, no sobre el productor)."""
+        action = cmd.get('cmd')
+        if action == 'pause':
+            self.paused = True
+        elif action == 'resume':
+            self.paused = False
+            self._pasos = 0
+        elif action == 'step':
+            # Reproducir un tick más del buffer aunque esté en pausa
+            self.paused = True
+            self._pasos += 1
+        elif action == 'stop':
+            self.stopped = True
+            if self.buffer is not None:
+                self.buffer.cancelar()
+        elif action == 'set_speed':
+            self.tick_delay = float(cmd.get('value', self.tick_delay))
+
+    def terminada(self) -> bool:
+        sim = self.sim
+        return not self.pending_clients and not sim.has_pending_arrivals() and sim.all_done()
+
+    def _producir(self, buffer: BufferAdelanto):
+        """Hilo productor: avanza la simulación y deja los frames de cada tick en el buffer."""
+        sim = self.sim
+        try:
+            while sim.tick < self.max_ticks and not self.stopped:
+                # Continuar si hay clientes pendientes de entrar O clientes activos en la simulación
+                if self.terminada():
+                    print(f"✅ Todos los clientes terminaron en tick {sim.tick}")
+                    break
+
+                # Insertar clientes cuyo entry_tick coincide con el tick actual
+                entering_now = [c for c in self.pending_clients if c.entry_tick == sim.tick]
+                for c in entering_now:
+                    sim.add_client(c, (0, 0))
+                    self.pending_clients.remove(c)
+                    if registro.nivel <= DEBUG:
+                        registro.emitir(DEBUG, "cliente.entra", tick=sim.tick, cliente=c.id)
+                sim._spawn_clients_if_due()
+
+                # Debug: mostrar pending cada 10 ticks
+                if sim.tick % 10 == 0 and self.pending_clients and registro.nivel <= DEBUG:
+                    registro.emitir(DEBUG, "llegadas.pendientes", tick=sim.tick, pendientes=len(self.pending_clients),
+                                    proximos=sorted([c.entry_tick for c in self.pending_clients[:3]]))
+
+                sim.step()
+                frames = self.frames()
+                if self.grabador is not None:
+                    self._grabar(frames)
+                if not buffer.poner(sim.tick, frames):
+                    break
+        except Exception as e:
+            buffer.terminar(e)
+            return
+        buffer.terminar()
+
+    def ejecutar(self, emitir: Callable[[Frame], None], comandos: "queue.Queue[dict]"):
+        """
+        Ciclo principal: lanza el productor y reproduce los ticks del buffer
+        cada tick_delay segundos, procesando los comandos de `comandos` y
+        entregando cada frame con `emitir`.
+        """
+        for payload in self.mensajes_iniciales():
+            emitir(payload)
+
+        buffer = self.buffer = BufferAdelanto(self.buffer_ticks)
+        productor = threading.Thread(target=self._producir, args=(buffer,), daemon=True)
+        productor.start()
+        proximo = time.monotonic()
+        try:
+            while not self.stopped:
+                # Procesar comandos pendientes (no bloqueante)
+                while not comandos.empty():
+                    self.comando(comandos.get_nowait())
+                if self.stopped:
+                    break
+
+                if self.paused and not self._pasos:
+                    # en pausa solo se esperan comandos; el productor sigue llenando el buffer
+                    try:
+                        self.comando(comandos.get(timeout=0.5))
+                    except queue.Empty:
+                        pass
+                    proximo = time.monotonic()
+                    continue
+
+                # Esperar hasta el próximo tick o hasta que llegue un comando (los step no esperan)
+                espera = proximo - time.monotonic()
+                if espera > 0 and not self._pasos:
+                    try:
+                        self.comando(comandos.get(timeout=espera))
+                        continue
+                    except queue.Empty:
+                        pass
+
+                item = buffer.tomar(timeout=0.5)
+                if item is None:
+                    break  # el productor terminó y ya se reprodujo todo
+                tick, frames = item
+                if not frames:
+                    continue  # el productor va atrasado respecto de la velocidad pedida
+                self.tick_mostrado = tick
+                self._recordar(frames)
+                for payload in frames:
+                    emitir(payload)
+                if self._pasos:
+                    self._pasos -= 1
+                # si el productor se atrasó no se recupera el tiempo con una ráfaga de frames
+                proximo = max(proximo + self.tick_delay, time.monotonic())
+        finally:
+            buffer.cancelar()
+            productor.join()
+        if buffer.error is not None:
+            raise buffer.error
+
+    def _estado_para_graficas(self) -> dict:
+        """Métricas por cliente y stats del tick mostrado."""
+        if not self.binario:
+            return self._estado_mostrado()
+        metricas = self._metricas_mostradas or {}
+        return {'client_metrics': metricas.get('client_metrics', []),
+                'stats': decodificar_binario(self._binario_mostrado)['stats']}
+
+    def generar_graficas(self) -> Optional[str]:
+        """Gráficas de la corrida (matplotlib); retorna el prefijo de los archivos."""
+        print("📊 Generando gráficas...")
+        from analytics import SimulationAnalytics
+
+        sim = self.sim
+        analytics_data = sim.get_analytics_data()
+        if self.adelantada():
+            # solo lo que se mostró: las métricas del tick t se registran antes de pasar a t+1
+            final_state_temp = self._estado_para_graficas()
+            hasta = self.tick_mostrado
+            for serie in ('checkout_utilization', 'queue_lengths'):
+                analytics_data[serie] = {
+                    nombre: {clave: [v for t, v in zip(datos['ticks'], valores) if t < hasta]
+                             for clave, valores in datos.items()}
+                    for nombre, datos in analytics_data[serie].items()
+                }
+            inicio = sim.metrics_start_tick if sim.metrics_start_tick is not None else hasta
+            analytics_data['occupancy_history'] = analytics_data['occupancy_history'][:max(0, hasta - inicio)]
+        else:
+            final_state_temp = estado_completo(sim)
+        simulation_data = {
+            'client_metrics': final_state_temp.get('client_metrics', []),
+            'stats': final_state_temp.get('stats', {}),
+            'checkout_utilization': analytics_data.get('checkout_utilization', {}),
+            'queue_lengths': analytics_data.get('queue_lengths', {}),
+            'occupancy_history': analytics_data.get('occupancy_history', [])
+        }
+        analytics = SimulationAnalytics(output_dir="resultados_simulacion")
+        base_name = analytics.save_all_charts(simulation_data, dia=self.dia, hora=self.hora)
+        print(f"✅ Gráficas guardadas en: resultados_simulacion/{base_name}_*.png")
+        return base_name
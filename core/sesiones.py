@@ -0,0 +1,325 @@
+"""
+Gestor de sesiones de simulación sobre un pool acotado de procesos worker.
+
+Cada worker es un proceso de larga vida que corre una SesionSimulacion a la
+vez; se comunica con el servidor por un Pipe: recibe ("iniciar", ...) y
+("cmd", comando) y devuelve ("frame", payload, tipo, tick, cpu) y al
+terminar ("fin", motivo, tick, cpu). En el servidor un hilo lector por
+worker publica los frames en la Sala de la sesión (core.salas), que los
+reparte a quien la abrió y a sus espectadores. La cola de quien la abrió es
+corta: si su navegador va atrasado, el envío del worker se bloquea. La simulación no se detiene por
+eso: sus frames pasan por un BufferFrames que conserva solo el estado más
+reciente (fusionando deltas) y cuenta los frames descartados.
+
+Control de admisión: hay a lo sumo `workers` sesiones corriendo y
+`max_espera` en espera; más allá se rechazan. Cada sesión tiene un
+presupuesto de CPU (segundos de CPU del worker); al agotarlo se detiene.
+
+Los límites por defecto se pueden cambiar con SIM_WORKERS, SIM_MAX_ESPERA
+y SIM_CPU_POR_SESION.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+from core.frames import BufferFrames, codificar_payload, tipo_frame
+from core.salas import Sala, Suscriptor
+
+MAX_TERMINADAS = 100
+
+
+# ---------------------------------------------------------------------------
+# Lado worker
+# ---------------------------------------------------------------------------
+
+def _bucle_worker(conn):
+    """Proceso worker: corre sesiones una tras otra hasta recibir ("salir",)."""
+    control: "queue.Queue[tuple]" = queue.Queue()
+    comandos = {"actual": queue.Queue()}
+
+    def lector():
+        # único lector del pipe: los comandos van a la sesión en curso, el resto al bucle
+        try:
+            while True:
+                msg = conn.recv()
+                if msg[0] == "cmd":
+                    comandos["actual"].put(msg[1])
+                else:
+                    control.put(msg)
+        except (EOFError, OSError):
+            control.put(("salir",))
+
+    threading.Thread(target=lector, daemon=True).start()
+    while True:
+        msg = control.get()
+        if msg[0] == "salir":
+            break
+        _, config, presupuesto = msg
+        comandos["actual"] = queue.Queue()
+        _correr_sesion(conn, config, presupuesto, comandos["actual"])
+
+
+def _correr_sesion(conn, config: dict, presupuesto: Optional[float], comandos: queue.Queue):
+    from core.sesion import SesionSimulacion
+
+    inicio = time.process_time()
+    estado = {"motivo": "completada", "sesion": None}
+    buffer = BufferFrames()
+
+    def cpu():
+        return time.process_time() - inicio
+
+    def tick():
+        # tick reproducido (el productor de la sesión puede ir adelantado)
+        return estado["sesion"].tick_mostrado if estado["sesion"] is not None else 0
+
+    def emisor():
+        # envía el frame más reciente; conn.send bloquea si el navegador va atrasado
+        while True:
+            frame = buffer.tomar()
+            if frame is None:
+                return
+            conn.send(("frame", codificar_payload(frame), tipo_frame(frame), tick(), cpu()))
+
+    def emitir(frame):
+        buffer.poner(frame)
+        sesion = estado["sesion"]
+        if presupuesto is not None and cpu() > presupuesto and not sesion.stopped:
+            sesion.stopped = True
+            estado["motivo"] = "presupuesto_cpu"
+
+    hilo_emisor = threading.Thread(target=emisor, daemon=True)
+    hilo_emisor.start()
+    try:
+        sesion = estado["sesion"] = SesionSimulacion(config)
+        sesion.ejecutar(emitir, comandos)
+        if sesion.stopped and estado["motivo"] == "completada":
+            estado["motivo"] = "detenida"
+        try:
+            sesion.generar_graficas()
+        except Exception as e:
+            print(f"❌ Error generando gráficas: {e}")
+        buffer.poner(sesion.estado_final())
+    except Exception as e:
+        traceback.print_exc()
+        estado["motivo"] = f"error: {e}"
+    finally:
+        if estado["sesion"] is not None:
+            estado["sesion"].cerrar()
+    buffer.cerrar()
+    hilo_emisor.join()
+    conn.send(("fin", estado["motivo"], tick(), cpu()))
+
+
+# ---------------------------------------------------------------------------
+# Lado servidor
+# ---------------------------------------------------------------------------
+
+class InfoSesion:
+    """Sesión vista desde el servidor: estado, progreso y sala que difunde sus frames."""
+
+    def __init__(self, config: dict, cliente: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.config = config
+        self.cliente = cliente
+        self.creada = time.time()
+        self.estado = "esperando"  # esperando | corriendo | terminada | cancelada | rechazada
+        self.motivo: Optional[str] = None
+        self.tick = 0
+        self.cpu = 0.0
+        self.sala = Sala()
+        self.worker = None
+
+    def resumen(self) -> dict:
+        return {
+            "id": self.id,
+            "cliente": self.cliente,
+            "estado": self.estado,
+            "motivo": self.motivo,
+            "creada": self.creada,
+            "tick": self.tick,
+            "cpu_segundos": round(self.cpu, 3),
+            "espectadores": len(self.sala.espectadores),
+            "day": self.config.get("day"),
+            "hour": self.config.get("hour"),
+            "max_ticks": self.config.get("max_ticks"),
+        }
+
+
+class _Worker:
+    def __init__(self, contexto):
+        self.conn, extremo = contexto.Pipe()
+        self.proceso = contexto.Process(target=_bucle_worker, args=(extremo,), daemon=True)
+        self.proceso.start()
+        extremo.close()
+        self.sesion: Optional[InfoSesion] = None
+
+
+class GestorSesiones:
+    """
+    Admite, encola, corre y cancela sesiones sobre a lo sumo `workers` procesos.
+    Sus métodos se llaman desde el event loop.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_espera: Optional[int] = None,
+                 cpu_por_sesion: Optional[float] = None):
+        self.workers = workers or int(os.environ.get("SIM_WORKERS", 0)) or os.cpu_count() or 1
+        self.max_espera = max_espera if max_espera is not None else int(os.environ.get("SIM_MAX_ESPERA", 16))
+        if cpu_por_sesion is None:
+            cpu_por_sesion = float(os.environ.get("SIM_CPU_POR_SESION", 300))
+        self.cpu_por_sesion = cpu_por_sesion if cpu_por_sesion > 0 else None
+        self._contexto = multiprocessing.get_context("spawn")
+        self._libres: List[_Worker] = []
+        self._todos: List[_Worker] = []
+        self._espera: deque = deque()
+        self._sesiones: Dict[str, InfoSesion] = {}
+        self._terminadas: deque = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # -- ciclo de vida de los workers -------------------------------------
+
+    def _nuevo_worker(self) -> _Worker:
+        worker = _Worker(self._contexto)
+        self._todos.append(worker)
+        threading.Thread(target=self._leer_worker, args=(worker,), daemon=True).start()
+        return worker
+
+    def _worker_libre(self) -> Optional[_Worker]:
+        if self._libres:
+            return self._libres.pop()
+        if len(self._todos) < self.workers:
+            return self._nuevo_worker()
+        return None
+
+    def cerrar(self):
+        """Detiene todos los workers (al apagar el servidor)."""
+        for worker in self._todos:
+            try:
+                worker.conn.send(("salir",))
+            except (OSError, ValueError):
+                pass
+        for worker in self._todos:
+            worker.proceso.join(timeout=2)
+            if worker.proceso.is_alive():
+                worker.proceso.terminate()
+        self._todos, self._libres = [], []
+
+    # -- admisión y asignación ---------------------------------------------
+
+    def abrir(self, config: dict, cliente: Optional[str] = None) -> InfoSesion:
+        """
+        Admite una sesión: corre de inmediato si hay un worker libre, si no queda
+        en espera; con la espera llena queda en estado "rechazada".
+        """
+        self._loop = asyncio.get_running_loop()
+        sesion = InfoSesion(config, cliente)
+        if config.get("grabar"):
+            # la grabación se guarda con el id de la sesión (ver /ws/replay/{id})
+            sesion.config = config = dict(config, run_id=sesion.id)
+        if len(self._todos) - len(self._libres) >= self.workers and len(self._espera) >= self.max_espera:
+            sesion.estado = "rechazada"
+            sesion.motivo = "servidor ocupado"
+            return sesion
+        self._sesiones[sesion.id] = sesion
+        self._espera.append(sesion)
+        self._asignar()
+        if sesion.estado == "esperando":
+            sesion.sala.principal.cola.put_nowait('{"frame": "espera", "posicion": %d}' % len(self._espera))
+        return sesion
+
+    def _asignar(self):
+        while self._espera:
+            worker = self._worker_libre()
+            if worker is None:
+                return
+            sesion = self._espera.popleft()
+            sesion.estado = "corriendo"
+            sesion.worker = worker
+            worker.sesion = sesion
+            worker.conn.send(("iniciar", sesion.config, self.cpu_por_sesion))
+
+    def comando(self, sesion: InfoSesion, cmd: dict):
+        """Reenvía un comando del navegador al worker de la sesión."""
+        if sesion.estado == "corriendo":
+            sesion.worker.conn.send(("cmd", cmd))
+        elif sesion.estado == "esperando" and cmd.get("cmd") == "stop":
+            self.cancelar(sesion.id)
+
+    def cancelar(self, sesion_id: str) -> bool:
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is None or sesion.estado not in ("esperando", "corriendo"):
+            return False
+        sesion.motivo = "cancelada"
+        if sesion.estado == "esperando":
+            self._espera.remove(sesion)
+            self._finalizar(sesion, "cancelada")
+            asyncio.get_running_loop().create_task(sesion.sala.cerrar())
+        else:
+            sesion.worker.conn.send(("cmd", {"cmd": "stop"}))
+        return True
+
+    def unirse(self, sesion_id: str) -> Optional[Suscriptor]:
+        """Suma un espectador a la sala de una sesión en espera o en curso."""
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is None or sesion.estado not in ("esperando", "corriendo"):
+            return None
+        return sesion.sala.unirse()
+
+    def salir(self, sesion_id: str, espectador: Suscriptor):
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is not None:
+            sesion.sala.salir(espectador)
+
+    def listar(self) -> List[dict]:
+        return [s.resumen() for s in self._sesiones.values()]
+
+    def _finalizar(self, sesion: InfoSesion, estado: str):
+        sesion.estado = estado
+        self._terminadas.append(sesion.id)
+        while len(self._terminadas) > MAX_TERMINADAS:
+            self._sesiones.pop(self._terminadas.popleft(), None)
+
+    def _liberar(self, worker: _Worker, motivo: str, vivo: bool = True):
+        sesion = worker.sesion
+        worker.sesion = None
+        if sesion is not None:
+            cancelada = sesion.motivo == "cancelada"
+            sesion.motivo = "cancelada" if cancelada else motivo
+            self._finalizar(sesion, "cancelada" if cancelada else "terminada")
+        if vivo:
+            self._libres.append(worker)
+        elif worker in self._todos:
+            self._todos.remove(worker)
+        self._asignar()
+
+    # -- hilo lector por worker --------------------------------------------
+
+    def _leer_worker(self, worker: _Worker):
+        while True:
+            try:
+                msg = worker.conn.recv()
+            except (EOFError, OSError):
+                # el proceso murió (o se cerró el pool): cerrar su sesión y sacarlo del pool
+                sesion = worker.sesion
+                if self._loop is not None and not self._loop.is_closed():
+                    self._loop.call_soon_threadsafe(self._liberar, worker, "error: worker terminó", False)
+                    if sesion is not None:
+                        asyncio.run_coroutine_threadsafe(sesion.sala.cerrar(), self._loop)
+                return
+            sesion = worker.sesion
+            if msg[0] == "frame":
+                _, payload, tipo, sesion.tick, sesion.cpu = msg
+                asyncio.run_coroutine_threadsafe(sesion.sala.publicar(payload, tipo), self._loop).result()
+            elif msg[0] == "fin":
+                _, motivo, sesion.tick, sesion.cpu = msg
+                # liberar antes de cerrar la cola: el handler ve la sesión ya terminada
+                self._loop.call_soon_threadsafe(self._liberar, worker, motivo)
+                asyncio.run_coroutine_threadsafe(sesion.sala.cerrar(), self._loop).result()
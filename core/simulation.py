@@ -3,11 +3,19 @@ from core.store_map import StoreMap
 from entities.client import Client
 from entities.cell import CellType
 import time, random
-from core.distribuciones import intervalo_entre_clientes
+from core.distribuciones import (
+    intervalo_entre_clientes,
+    generar_llegadas_dia,
+    HORA_APERTURA,
+    HORA_CIERRE,
+    TICKS_POR_HORA,
+)
+from core.poblacion import FabricaClientes
+from core.eventos import registro, DEBUG
 
 
 class Simulation:
-    def __init__(self, store_map: StoreMap):
+    def __init__(self, store_map: StoreMap, precompute_delays: bool = False):
         self.map = store_map
         self.clients: List[Client] = []
         self.tick = 0
@@ -22,9 +30,20 @@ class Simulation:
         self.checkout_utilization_history = {}
         self.queue_length_history = {}
         self.occupancy_history = []
+        # Calentamiento: no se recopilan métricas antes de este tick
+        self.warmup_ticks = 0
+        self.metrics_start_tick: Optional[int] = None
 
         # Para que entren con tiempo de por medio
         self.arrival_schedule: List[Tuple[int, Client]] = []  # (tick, client)
+        # Llegadas perezosas: iterador de (tick, hora) + fábrica de clientes
+        self.arrival_stream = None
+        self.client_factory = None
+        self._next_arrival: Optional[Tuple[int, int]] = None
+        # flujos aleatorios dedicados (core.flujos.Flujos); None usa los RNG globales
+        self.flujos = None
+        # tiempos de paso precalculados por ruta (se propaga a cada cliente en add_client)
+        self.precompute_delays = precompute_delays
         self.entrance_pos: Optional[Tuple[int, int]] = self._find_entrance()
 
     def schedule_clients(self, clients: List[Client]):
@@ -34,15 +53,46 @@ class Simulation:
         current_tick = 0
         for c in clients:
             delta = intervalo_entre_clientes()
-            print("==="*30)
-            print(f"[Scheduling] Cliente {getattr(c, 'id', None)} programado para entrar en tick {current_tick + delta} (delta: {delta})")
-            print("==="*30)
+            if registro.nivel <= DEBUG:
+                registro.emitir(DEBUG, "llegadas.programado", cliente=getattr(c, 'id', None),
+                                tick=current_tick + delta, delta=delta)
             current_tick += delta
             self.arrival_schedule.append((current_tick, c))
 
         # Ordenamos por tick (por seguridad)
         self.arrival_schedule.sort(key=lambda x: x[0])
 
+    def schedule_arrival_stream(self, stream, client_factory):
+        """
+        Programa llegadas perezosas.
+
+        stream: iterable de (tick, hora), ordenado por tick.
+        client_factory: callable(hora) -> Client, se invoca solo cuando el cliente entra.
+        """
+        self.arrival_stream = iter(stream)
+        self.client_factory = client_factory
+        self._next_arrival = next(self.arrival_stream, None)
+
+    def schedule_day(self, dia: str, hora_inicio: int = HORA_APERTURA, hora_fin: int = HORA_CIERRE,
+                     ticks_por_hora: int = TICKS_POR_HORA, rng=None, pool=None):
+        """
+        Programa un día completo de llegadas (por defecto 08:00-22:00) en una sola corrida.
+        Los clientes se crean con FabricaClientes (atributos en bloque, instancias de `pool`).
+        Si la simulación tiene flujos dedicados y no se entrega rng, se usan esos flujos.
+        """
+        if rng is None and self.flujos is not None:
+            stream = generar_llegadas_dia(dia, hora_inicio, hora_fin, ticks_por_hora, rng=self.flujos.llegadas)
+            fabrica = FabricaClientes(dia, self.map, pool=pool, rng=self.flujos.clientes,
+                                      rng_listas=self.flujos.listas)
+        else:
+            stream = generar_llegadas_dia(dia, hora_inicio, hora_fin, ticks_por_hora, rng=rng)
+            fabrica = FabricaClientes(dia, self.map, pool=pool, rng=rng)
+        self.schedule_arrival_stream(stream, fabrica)
+
+    def has_pending_arrivals(self) -> bool:
+        """True si quedan clientes por entrar (programados o en el stream)."""
+        return bool(self.arrival_schedule) or self._next_arrival is not None
+
     def _spawn_clients_if_due(self):
         """
         Inserta los clientes que deben entrar en el tick actual.
@@ -51,10 +101,19 @@ class Simulation:
         for client in to_spawn:
             if self.entrance_pos:
                 self.add_client(client, self.entrance_pos)
-                print(f"[Tick {self.tick}] Cliente {getattr(client, 'id', None)} entra al supermercado.")
+                if registro.nivel <= DEBUG:
+                    registro.emitir(DEBUG, "cliente.entra", tick=self.tick, cliente=getattr(client, 'id', None))
         # Removemos los que ya entraron
         self.arrival_schedule = [(t, c) for (t, c) in self.arrival_schedule if t > self.tick]
 
+        # Consumir el stream de llegadas hasta el tick actual
+        while self._next_arrival is not None and self._next_arrival[0] <= self.tick:
+            _, hora = self._next_arrival
+            if self.entrance_pos:
+                client = self.client_factory(hora)
+                self.add_client(client, self.entrance_pos)
+            self._next_arrival = next(self.arrival_stream, None)
+
     def _find_entrance(self):
         for i in range(self.map.rows):
             for j in range(self.map.cols):
@@ -64,6 +123,9 @@ class Simulation:
 
     def add_client(self, client: Client, pos: Tuple[int, int]):
         self.clients.append(client)
+        if self.flujos is not None:
+            client.flujos = self.flujos
+        client.precompute_delays = self.precompute_delays
         self.map.place_client(client, pos)
         # record start tick for performance metrics
         try:
@@ -94,9 +156,15 @@ class Simulation:
                         item_factor = 1
                         
                         # 2. Calcular el ruido y el tiempo total (SOLO UNA VEZ)
-                        noise = random.randint(0, 2) 
+                        if self.flujos is not None:
+                            noise = self.flujos.servicio.integers(0, 3)
+                        else:
+                            noise = random.randint(0, 2) 
                         calculated_service_time = base_time + num_items * item_factor + noise 
-                        print(f"Tiempo calculado para cliente {getattr(client_in_front, 'id', None)} en caja {(i, j)}: {calculated_service_time} ticks (items: {num_items}, ruido: {noise})")
+                        if registro.nivel <= DEBUG:
+                            registro.emitir(DEBUG, "caja.tiempo_servicio", tick=self.tick,
+                                            cliente=getattr(client_in_front, 'id', None), caja=(i, j),
+                                            ticks=calculated_service_time, items=num_items, ruido=noise)
                         service_time_initial = max(1, calculated_service_time) # Tiempo inicial de servicio (ticks)
 
                         # 3. ASIGNAR EL TIEMPO CALCULADO AL CLIENTE (para recuperarlo al final)
@@ -112,12 +180,14 @@ class Simulation:
                     timer -= 1
                     if timer <= 0:
                         # service customer: dequeue and move to EXIT (nearest)
-                        served = cell.queue.pop(0)
+                        served = self.map.dequeue_client(key)
                         
                         # RECUPERAMOS EL VALOR DEL CLIENTE
                         final_service_time = served.checkout_time
                         
-                        print(f"[Simulation] Serving client {getattr(served, 'id', None)} at checkout {(i, j)}, service time: {final_service_time} ticks")
+                        if registro.nivel <= DEBUG:
+                            registro.emitir(DEBUG, "caja.atendido", tick=self.tick, cliente=getattr(served, 'id', None),
+                                            caja=(i, j), ticks=final_service_time)
                         # place served client to exit cell if possible
                         exit_pos = self._find_exit_or_entrance()
                         if exit_pos:
@@ -155,10 +225,41 @@ class Simulation:
         # todos los clientes finished?
         return all(getattr(c, "shopping_done", False) for c in self.clients)
     
+    def __getstate__(self):
+        # el stream de llegadas puede ser un generador (no copiable): se materializa
+        # lo que queda en una lista para poder copiar/serializar la simulación
+        state = self.__dict__.copy()
+        if self.arrival_stream is not None:
+            pendientes = list(self.arrival_stream)
+            self.arrival_stream = iter(pendientes)
+            state["arrival_stream"] = iter(pendientes)
+        return state
+
+    def reset_metrics(self):
+        """Descarta las métricas recopiladas (p.ej. al terminar el calentamiento)."""
+        self.checkout_utilization_history = {}
+        self.queue_length_history = {}
+        self.occupancy_history = []
+        self.metrics_start_tick = None
+
+    def advance(self, ticks: int):
+        """Avanza `ticks` ticks sin visualización ni pausas (deja de avanzar si no queda nada por simular)."""
+        for _ in range(ticks):
+            if not self.has_pending_arrivals() and self.all_done():
+                break
+            self._spawn_clients_if_due()
+            self.step()
+
     def _collect_metrics(self):
         """
         Recopila métricas en cada tick para análisis posterior.
         """
+        # Durante el calentamiento no se registra el transitorio
+        if self.tick < self.warmup_ticks:
+            return
+        if self.metrics_start_tick is None:
+            self.metrics_start_tick = self.tick
+
         # Utilización y longitud de colas por cajero
         for i in range(self.map.rows):
             for j in range(self.map.cols):
@@ -253,7 +354,7 @@ class Simulation:
                 print("Continuando sin animación. Para animar instale: pip install matplotlib pillow")
                 animate = False
 
-        while self.tick < self.max_ticks and not self.all_done():
+        while self.tick < self.max_ticks and (self.has_pending_arrivals() or not self.all_done()):
             
             self._spawn_clients_if_due()
 
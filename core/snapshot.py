@@ -0,0 +1,73 @@
+"""
+Snapshot / restore de una Simulation completa en un archivo binario compacto.
+
+El snapshot incluye el StoreMap (grilla, colas y suscriptores), los clientes,
+checkout_timers, el calendario y stream de llegadas pendientes, los flujos
+aleatorios dedicados, los buffers de métricas y el estado de los RNG globales
+(random y numpy), de modo que la continuación restaurada es idéntica a la
+original.
+
+Formato: MAGIA (8 bytes) + pickle comprimido con zlib.
+"""
+
+import pickle
+import random
+import zlib
+from typing import Tuple
+
+import numpy as np
+
+from core.simulation import Simulation
+from entities.client import Client
+
+MAGIA = b"GSSNAP01"
+NIVEL_COMPRESION = 6
+
+
+def snapshot_bytes(sim: Simulation) -> bytes:
+    """Serializa la simulación y el estado de los RNG globales a bytes."""
+    estado = {
+        "simulacion": sim,
+        "random_state": random.getstate(),
+        "numpy_state": np.random.get_state(),
+        "client_id_counter": Client._id_counter,
+    }
+    datos = pickle.dumps(estado, protocol=pickle.HIGHEST_PROTOCOL)
+    return MAGIA + zlib.compress(datos, NIVEL_COMPRESION)
+
+
+def restaurar_bytes(data: bytes, restaurar_rng: bool = True) -> Simulation:
+    """
+    Reconstruye la simulación desde bytes de snapshot_bytes.
+    Con restaurar_rng=True también se restauran random, numpy y el contador de IDs.
+    """
+    if data[:len(MAGIA)] != MAGIA:
+        raise ValueError("No es un snapshot de simulación válido")
+    estado = pickle.loads(zlib.decompress(data[len(MAGIA):]))
+    if restaurar_rng:
+        random.setstate(estado["random_state"])
+        np.random.set_state(estado["numpy_state"])
+        Client._id_counter = estado["client_id_counter"]
+    return estado["simulacion"]
+
+
+def guardar_snapshot(sim: Simulation, path: str) -> int:
+    """Guarda el snapshot en `path`; retorna el tamaño en bytes."""
+    data = snapshot_bytes(sim)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def cargar_snapshot(path: str, restaurar_rng: bool = True) -> Simulation:
+    """Carga un snapshot guardado con guardar_snapshot."""
+    with open(path, "rb") as f:
+        return restaurar_bytes(f.read(), restaurar_rng)
+
+
+def info_snapshot(path: str) -> Tuple[int, int, int]:
+    """(tick, clientes, tamaño en bytes) de un snapshot, útil para listarlos."""
+    with open(path, "rb") as f:
+        data = f.read()
+    sim = restaurar_bytes(data, restaurar_rng=False)
+    return sim.tick, len(sim.clients), len(data)
@@ -1,14 +1,27 @@
 import os
 import json
-from typing import List, Tuple, Dict, Optional
+from collections import deque
+from typing import List, Tuple, Dict, Optional, Callable
+
+import numpy as np
+
 from entities.cell import Cell, CellType, Direction
 from entities.client import Client
+from core.eventos import registro, DEBUG, TRACE
 
 
 class StoreMap:
     def __init__(self, rows: int = None, cols: int = None, from_file: str = None, symbol_file: str = "symbol_map.json"):
         self.symbol_config: Dict[str, dict] = {}
         self._setup_symbol_map(symbol_file)
+        # suscriptores a cambios de longitud de cola: callback(store_map, pos, delta)
+        self._queue_listeners: List[Callable] = []
+        # find_best_checkout desempata por distancia Manhattan; con True usa la
+        # distancia caminando (tabla checkout_distances, opcional: cambia el modelo)
+        self.walking_distance = False
+        # distancias caminando desde cada caja (se calculan al primer uso)
+        self.posiciones_cajas = None
+        self.distancias_cajas = None
 
         if from_file:
             self.load_from_file(from_file)
@@ -71,6 +84,27 @@ class StoreMap:
                 row.append(Cell(CellType.AISLE, i, len(row), capacity=4))
             self.grid.append(row)
 
+    # eventos de colas
+    def subscribe_queue_changes(self, callback: Callable):
+        """Registra callback(store_map, pos, delta) para cambios de longitud de cola."""
+        if callback not in self._queue_listeners:
+            self._queue_listeners.append(callback)
+
+    def unsubscribe_queue_changes(self, callback: Callable):
+        if callback in self._queue_listeners:
+            self._queue_listeners.remove(callback)
+
+    def notify_queue_change(self, pos: Tuple[int, int], delta: int):
+        """Publica un cambio de longitud (+1 entra, -1 sale) en la cola de `pos`."""
+        for callback in list(self._queue_listeners):
+            callback(self, pos, delta)
+
+    def dequeue_client(self, pos: Tuple[int, int]) -> 'Client':
+        """Saca al primer cliente de la cola del checkout en `pos` y publica el cambio."""
+        served = self.get_cell(*pos).queue.pop(0)
+        self.notify_queue_change(pos, -1)
+        return served
+
     # helpers
     def in_bounds(self, pos: Tuple[int, int]) -> bool:
         r, c = pos
@@ -132,9 +166,11 @@ class StoreMap:
             if client in from_cell.clients:
                 from_cell.remove_client(client)
             to_cell.queue.append(client)
-            print(f"[StoreMap] Client {getattr(client,'id',None)} joined checkout queue at {to_pos}")
+            if registro.nivel <= DEBUG:
+                registro.emitir(DEBUG, "caja.cola", cliente=getattr(client, 'id', None), caja=to_pos)
             client.pos = to_pos
             client.in_queue = True
+            self.notify_queue_change(to_pos, +1)
             return True
         elif to_cell.type in (CellType.ENTRANCE, CellType.EXIT):
             if client in from_cell.clients:
@@ -149,8 +185,12 @@ class StoreMap:
         if not cell:
             raise ValueError("Posición fuera de rango")
         # don't strictly check capacity here; use move_client in simulation loop
+        en_cola = len(cell.queue)
         cell.add_client(client)
         client.pos = pos
+        # solo se publica si la cola cambió de verdad (no si el cliente quedó en cell.clients)
+        if len(cell.queue) != en_cola:
+            self.notify_queue_change(pos, len(cell.queue) - en_cola)
 
     def get_products(self) -> List[Tuple[str, int, Tuple[int, int]]]:
         """
@@ -182,14 +222,51 @@ class StoreMap:
                     #q.append(n)
         #return None
 
+    def checkout_distances(self):
+        """
+        Distancia caminando (BFS, sin atravesar estanterías ni obstáculos) desde
+        cada caja a todas las celdas. Retorna ({pos_caja: k}, tabla) con tabla
+        de forma (n_cajas, rows, cols) y -1 donde no hay camino. Se calcula una
+        vez; un mapa publicado en memoria compartida ya la trae hecha.
+        """
+        if getattr(self, "distancias_cajas", None) is None:
+            cajas = [(i, j) for i in range(self.rows) for j in range(self.cols)
+                     if self.grid[i][j].type == CellType.CHECKOUT]
+            distancias = np.full((len(cajas), self.rows, self.cols), -1, dtype=np.int32)
+            for k, origen in enumerate(cajas):
+                distancias[k][origen] = 0
+                cola = deque([origen])
+                while cola:
+                    r, c = cola.popleft()
+                    for nr, nc in self.get_neighbors(r, c):
+                        if distancias[k, nr, nc] >= 0 or self.grid[nr][nc].type == CellType.SHELF:
+                            continue
+                        distancias[k, nr, nc] = distancias[k, r, c] + 1
+                        cola.append((nr, nc))
+            self.posiciones_cajas = np.array(cajas, dtype=np.int32).reshape(-1, 2)
+            self.distancias_cajas = distancias
+            self._indice_cajas = None
+        if getattr(self, "_indice_cajas", None) is None:
+            self._indice_cajas = {(int(r), int(c)): k for k, (r, c) in enumerate(self.posiciones_cajas)}
+        return self._indice_cajas, self.distancias_cajas
+
+    def invalidate_checkout_distances(self):
+        """Descarta la tabla de distancias (después de abrir o cerrar cajas)."""
+        self.posiciones_cajas = None
+        self.distancias_cajas = None
+        self._indice_cajas = None
+
     def find_best_checkout(self, row: int, col: int) -> Optional[Tuple[int, int]]:
         """
         Encuentra el mejor cajero considerando:
         - Gente en fila
         - Gente caminando hacia ese cajero
-        - Distancia
+        - Distancia (Manhattan; caminando si walking_distance)
         """
         checkouts = []
+        indice, distancias = self.checkout_distances() if getattr(self, "walking_distance", False) else ({}, None)
+        # sin camino: después de cualquier caja alcanzable
+        sin_camino = self.rows * self.cols
         
         # Obtener todos los clientes del mapa
         all_clients = []
@@ -214,6 +291,10 @@ class StoreMap:
                     # Carga total = en fila + en camino
                     total_load = queue_length + clients_heading_here
                     distance = abs(i - row) + abs(j - col)
+                    k = indice.get((i, j))
+                    if k is not None:
+                        caminando = int(distancias[k, row, col])
+                        distance = caminando if caminando >= 0 else sin_camino + distance
                     
                     checkouts.append((total_load, distance, (i, j)))
         
@@ -222,8 +303,9 @@ class StoreMap:
         
         checkouts.sort(key=lambda x: (x[0], x[1]))
         
-        print(f"[StoreMap] Mejor cajero en {checkouts[0][2]}: "
-            f"carga_total={checkouts[0][0]}, distancia={checkouts[0][1]}")
+        if registro.nivel <= TRACE:
+            registro.emitir(TRACE, "caja.mejor", caja=checkouts[0][2],
+                            carga_total=checkouts[0][0], distancia=checkouts[0][1])
         
         return checkouts[0][2]
 
@@ -0,0 +1,182 @@
+"""
+Trabajos batch (sin WebSocket): un escenario con N réplicas corrido en
+segundo plano sobre un ProcessPoolExecutor compartido por todos los trabajos.
+
+Cada réplica es una tarea del pool (core.replicas.ejecutar_replica), así
+que cientos de trabajos encolados se reparten entre los workers sin
+serialización por tick. El estado se consulta con GestorTrabajos.estado.
+
+Los trabajos con semilla pasan por la caché de resultados (core.cache): un
+escenario ya corrido con la misma semilla, réplicas y versión del código se
+responde de inmediato, con sus gráficas si se pidieron. Las gráficas de
+trabajos sin semilla quedan en un temporal de la caché que se borra al
+cabo de una hora.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from core.cache import CacheResultados, clave_escenario
+from core.escenario import normalizar_escenario, graficas_escenario
+from core.replicas import ejecutar_replica, resumir_replicas, semillas_replicas
+
+MAX_TRABAJOS = 1000
+
+
+class Trabajo:
+    def __init__(self, escenario: dict, replicas: int, semilla: Optional[int], graficas: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.escenario = escenario
+        self.replicas = replicas
+        self.semilla = semilla
+        self.semillas: List[int] = []  # semillas de las réplicas, en el orden del resumen
+        self.graficas = graficas
+        self.clave: Optional[str] = None
+        self.cache: Optional[str] = None  # "hit" | "miss" | None (no cacheable)
+        self.dir_graficas: Optional[str] = None
+        self.graficas_listas = not graficas
+        self.estado = "en_cola"  # en_cola | corriendo | completado | error
+        self.creado = time.time()
+        self.terminado: Optional[float] = None
+        self.resultados: List[dict] = []
+        self.kpis: Optional[Dict[str, dict]] = None
+        self.error: Optional[str] = None
+
+    def resumen(self, detalle: bool = False) -> dict:
+        datos = {
+            "id": self.id,
+            "estado": self.estado,
+            "escenario": self.escenario,
+            "replicas": self.replicas,
+            "completadas": len(self.resultados),
+            "semilla": self.semilla,
+            "creado": self.creado,
+            "terminado": self.terminado,
+            "kpis": self.kpis,
+            "error": self.error,
+            "cache": self.cache,
+            "graficas": self.archivos_graficas() if self.estado == "completado" else [],
+        }
+        if detalle:
+            datos["resultados"] = list(self.resultados)
+        return datos
+
+    def archivos_graficas(self) -> List[str]:
+        """Gráficas del trabajo, relativas a dir_graficas."""
+        if self.dir_graficas is None or not os.path.isdir(self.dir_graficas):
+            return []
+        return sorted(os.path.relpath(os.path.join(raiz, n), self.dir_graficas)
+                      for raiz, _, nombres in os.walk(self.dir_graficas) for n in nombres if n.endswith(".png"))
+
+
+class GestorTrabajos:
+    """Encola trabajos y agrega sus réplicas a medida que terminan."""
+
+    def __init__(self, workers: Optional[int] = None, cache: Optional[CacheResultados] = None):
+        self.workers = workers or int(os.environ.get("SIM_JOB_WORKERS", 0)) or os.cpu_count() or 1
+        self.cache = cache if cache is not None else CacheResultados()
+        self._ex: Optional[ProcessPoolExecutor] = None
+        self._trabajos: "OrderedDict[str, Trabajo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ejecutor(self) -> ProcessPoolExecutor:
+        if self._ex is None:
+            self._ex = ProcessPoolExecutor(max_workers=self.workers,
+                                           mp_context=multiprocessing.get_context("spawn"))
+        return self._ex
+
+    def enviar(self, escenario: dict, replicas: int = 10, semilla: Optional[int] = None,
+               graficas: bool = False) -> Trabajo:
+        """Encola un trabajo y retorna de inmediato (ya completado si estaba en caché)."""
+        trabajo = Trabajo(normalizar_escenario(escenario), replicas, semilla, graficas)
+        trabajo.clave = clave_escenario(trabajo.escenario, semilla, replicas, graficas)
+        with self._lock:
+            self._trabajos[trabajo.id] = trabajo
+            while len(self._trabajos) > MAX_TRABAJOS:
+                self._trabajos.popitem(last=False)
+
+        cacheado = self.cache.obtener(trabajo.clave)
+        if cacheado is not None:
+            trabajo.resultados = cacheado["resultados"]
+            trabajo.kpis = cacheado["kpis"]
+            trabajo.cache = "hit"
+            trabajo.dir_graficas = os.path.join(self.cache.ruta(trabajo.clave), "graficas") if graficas else None
+            trabajo.estado = "completado"
+            trabajo.terminado = time.time()
+            return trabajo
+        if trabajo.clave is not None:
+            trabajo.cache = "miss"
+
+        ex = self._ejecutor()
+        # se guardan: sin semilla maestra, semillas_replicas da otras en cada llamada
+        semillas = trabajo.semillas = semillas_replicas(semilla, replicas)
+        for s in semillas:
+            futuro = ex.submit(ejecutar_replica, trabajo.escenario, s)
+            futuro.add_done_callback(lambda f, t=trabajo: self._replica_terminada(t, f))
+        if graficas:
+            # las gráficas son de la primera réplica, en una tarea más del pool
+            trabajo.dir_graficas = self.cache.directorio_temporal()
+            futuro = ex.submit(graficas_escenario, trabajo.escenario, semillas[0], trabajo.dir_graficas)
+            futuro.add_done_callback(lambda f, t=trabajo: self._replica_terminada(t, f, graficas=True))
+        return trabajo
+
+    def _replica_terminada(self, trabajo: Trabajo, futuro, graficas: bool = False):
+        with self._lock:
+            if trabajo.estado == "error":
+                return
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                trabajo.estado = "error"
+                trabajo.error = f"{type(e).__name__}: {e}"
+                trabajo.terminado = time.time()
+                return
+            if graficas:
+                trabajo.graficas_listas = True
+            else:
+                trabajo.resultados.append(resultado)
+            trabajo.estado = "corriendo"
+            if len(trabajo.resultados) < trabajo.replicas or not trabajo.graficas_listas:
+                return
+            # orden estable (por semilla) para que el resumen no dependa del orden de llegada
+            orden = {s: k for k, s in enumerate(trabajo.semillas)}
+            trabajo.resultados.sort(key=lambda r: orden[r["semilla"]])
+            trabajo.kpis = resumir_replicas(trabajo.resultados)
+
+        if trabajo.clave is not None:
+            entrada = self.cache.guardar(trabajo.clave, {
+                "escenario": trabajo.escenario,
+                "semilla": trabajo.semilla,
+                "replicas": trabajo.replicas,
+                "kpis": trabajo.kpis,
+                "resultados": trabajo.resultados,
+            }, graficas=trabajo.dir_graficas)
+            if trabajo.graficas:
+                trabajo.dir_graficas = os.path.join(entrada, "graficas")
+        with self._lock:
+            trabajo.estado = "completado"
+            trabajo.terminado = time.time()
+
+    def estado(self, trabajo_id: str, detalle: bool = False) -> Optional[dict]:
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            return trabajo.resumen(detalle) if trabajo is not None else None
+
+    def grafica(self, trabajo_id: str, nombre: str) -> Optional[str]:
+        """Ruta absoluta de una gráfica del trabajo (solo nombres listados en su resumen)."""
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is None or trabajo.estado != "completado" or nombre not in trabajo.archivos_graficas():
+            return None
+        return os.path.join(trabajo.dir_graficas, nombre)
+
+    def cerrar(self):
+        if self._ex is not None:
+            self._ex.shutdown(wait=False, cancel_futures=True)
+            self._ex = None
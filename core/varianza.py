@@ -0,0 +1,72 @@
+"""
+Comparación de configuraciones con reducción de varianza.
+
+- Números aleatorios comunes (CRN): las dos configuraciones de cada par se
+  corren con la misma semilla y flujos dedicados (core.flujos), de modo que
+  llegadas, clientes, listas, servicio y movimientos coinciden y la
+  diferencia refleja solo el cambio de configuración.
+- Variables antitéticas: cada par se repite con los flujos antitéticos
+  (1 - u) y se promedian ambas diferencias.
+
+El reporte es de diferencias pareadas (A - B) con intervalo t-Student, junto
+con la reducción de varianza frente a réplicas independientes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from core.escenario import normalizar_escenario
+from core.replicas import KPIS, ejecutar_replica, intervalo_confianza, semillas_replicas
+
+
+def comparar_configuraciones(escenario_a: dict, escenario_b: dict, n: int, semilla: Optional[int] = None,
+                             antitetico: bool = False, workers: Optional[int] = None,
+                             confianza: float = 0.95, kpis=KPIS) -> dict:
+    """
+    Corre n pares (A, B) con números aleatorios comunes y reporta las diferencias pareadas.
+    Con antitetico=True cada par incluye además su réplica antitética (4 corridas por par).
+    """
+    escenario_a = normalizar_escenario(escenario_a)
+    escenario_b = normalizar_escenario(escenario_b)
+    semillas = semillas_replicas(semilla, n)
+    variantes = (False, True) if antitetico else (False,)
+
+    tareas = [(esc, s, anti) for s in semillas for anti in variantes for esc in (escenario_a, escenario_b)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+        corridas = list(ex.map(ejecutar_replica, *zip(*tareas)))
+
+    # corridas en orden: por semilla, por variante, (A, B)
+    por_par = len(variantes) * 2
+    pares = [corridas[i:i + por_par] for i in range(0, len(corridas), por_par)]
+
+    reporte = {}
+    for kpi in kpis:
+        a = np.array([[p[2 * v][kpi] for v in range(len(variantes))] for p in pares], dtype=float)
+        b = np.array([[p[2 * v + 1][kpi] for v in range(len(variantes))] for p in pares], dtype=float)
+        # promedio de la réplica y su antitética (si hay) antes de diferenciar
+        media_a, media_b = a.mean(axis=1), b.mean(axis=1)
+        diferencias = media_a - media_b
+        validas = np.isfinite(diferencias)
+        var_pareada = float(np.var(diferencias[validas], ddof=1)) if validas.sum() > 1 else float("nan")
+        var_independiente = float(np.var(media_a[validas], ddof=1) + np.var(media_b[validas], ddof=1)) \
+            if validas.sum() > 1 else float("nan")
+        reporte[kpi] = {
+            "a": intervalo_confianza(media_a, confianza),
+            "b": intervalo_confianza(media_b, confianza),
+            "diferencia": intervalo_confianza(diferencias, confianza),
+            # < 1 indica cuánto menos varianza tiene la diferencia pareada que con réplicas independientes
+            "razon_varianza": var_pareada / var_independiente if var_independiente else float("nan"),
+        }
+
+    return {
+        "escenario_a": escenario_a,
+        "escenario_b": escenario_b,
+        "pares": n,
+        "antitetico": antitetico,
+        "semilla": semilla,
+        "confianza": confianza,
+        "kpis": reporte,
+    }
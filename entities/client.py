@@ -1,8 +1,10 @@
+import math
 import random
 from typing import List, Tuple, Optional
 from pathfinding import a_star
 from entities.cell import CellType, Direction
-from core.distribuciones import calc_move_delay
+from core.distribuciones import calc_move_delay, calc_move_delays
+from core.eventos import registro, DEBUG, TRACE
 
 
 class Client:
@@ -17,6 +19,13 @@ class Client:
         cls._id_counter = 0
 
     def __init__(self, patience: float, tipo: str, velocidad: str):
+        self.reset(patience, tipo, velocidad)
+
+    def reset(self, patience: float, tipo: str, velocidad: str):
+        """
+        (Re)inicializa el cliente con nuevos atributos y un ID nuevo.
+        Permite reutilizar instancias entre réplicas (ver ClientPool).
+        """
         # parametros básicos
         if not (0 <= patience <= 1):
             raise ValueError("patience must be between 0 and 1")
@@ -38,6 +47,15 @@ class Client:
         self.move_delay = {'Rapido': 1, 'Normal': 2, 'Tranquilo': 3}[velocidad]
         self._delay_counter = 0
         self.moving_first_try = True
+        # Si es True, los tiempos de paso se muestrean en bloque al planear la ruta
+        # (lo fija la simulación al agregar el cliente, ver Simulation.add_client)
+        self.precompute_delays = False
+        self._step_delays: List[int] = []  # tiempos de paso precalculados (modo precompute_delays)
+        # reevaluación de cajero por eventos de cola
+        self._watching_queues = False
+        self._reevaluate_in: Optional[int] = None  # ticks hasta la próxima reevaluación
+        # flujos de números aleatorios dedicados (core.flujos); None usa los RNG globales
+        self.flujos = None
 
         self.lista: List[Tuple[str, int, Tuple[int, int]]] = []  # (cat, pid, pos)
         self.lista_len = 0
@@ -69,6 +87,9 @@ class Client:
         if len(products) > 0 and num < 1:
             num = 1
         picks = random.sample(products, num)
+        self.set_list(picks)
+
+    def set_list(self, picks: List[Tuple[str, int, Tuple[int, int]]]):
         # products are (cat, id, pos)
         self.lista_len = len(picks)
         self.lista = picks
@@ -87,6 +108,7 @@ class Client:
             # si no hay lista, objetivo: checkout nearest
             chk = store_map.find_best_checkout(*self.pos)
             self.target = chk
+            self._watch_queues(store_map)
             return self.target
         # elegir el producto en lista más cercano
         min_d = None
@@ -100,6 +122,59 @@ class Client:
         return self.target
 
 
+    def _random(self) -> float:
+        if self.flujos is not None:
+            return float(self.flujos.comportamiento.random())
+        return random.random()
+
+    def _watch_queues(self, store_map):
+        """Se suscribe a los cambios de cola mientras se dirige a un cajero."""
+        if not self._watching_queues:
+            store_map.subscribe_queue_changes(self._on_queue_change)
+            self._watching_queues = True
+
+    def _stop_watching_queues(self, store_map):
+        if self._watching_queues:
+            store_map.unsubscribe_queue_changes(self._on_queue_change)
+            self._watching_queues = False
+        self._reevaluate_in = None
+
+    def _on_queue_change(self, store_map, pos, delta):
+        """
+        Reacciona a un cambio de cola. Solo es relevante si la cola objetivo crece
+        o si otra cola se acorta; en ese caso se programa la reevaluación.
+
+        Antes se lanzaba una moneda con prob p = (1 - patience) * 0.3 en cada tick;
+        el tick del primer éxito sigue una geométrica(p), así que se muestrea
+        directamente cuántos ticks esperar.
+        """
+        if self.in_queue or self.shopping_done or self.target is None:
+            self._stop_watching_queues(store_map)
+            return
+        target_cell = store_map.get_cell(*self.target)
+        if target_cell is None or target_cell.type != CellType.CHECKOUT:
+            self._stop_watching_queues(store_map)
+            return
+
+        relevant = (pos == self.target and delta > 0) or (pos != self.target and delta < 0)
+        if not relevant or self._reevaluate_in is not None:
+            return
+
+        reevaluate_prob = (1 - self.patience) * 0.3  # Max 30% de prob por tick
+        if reevaluate_prob <= 0:
+            return
+        if reevaluate_prob >= 1:
+            self._reevaluate_in = 1
+        else:
+            u = self._random()
+            self._reevaluate_in = int(math.log(1 - u) / math.log(1 - reevaluate_prob)) + 1
+
+    def _head_to_checkout(self, store_map):
+        chk = store_map.find_best_checkout(*self.pos)
+        self.target = chk
+        self._watch_queues(store_map)
+        self.plan_path(store_map)
+
     def plan_path(self, store_map):
         """
         Planea un camino hacia el objetivo actual.
@@ -161,7 +236,12 @@ class Client:
             )
 
         self.path = path or []
-        print(f"[Client {self.id}] plan_path target={self.target} computed_path={self.path}")
+        if self.precompute_delays:
+            # un tiempo de paso por cada casilla de la ruta, muestreados en bloque
+            rng = self.flujos.movimiento if self.flujos is not None else None
+            self._step_delays = calc_move_delays(self.tipo, self.velocidad, len(self.path), rng=rng).tolist()
+        if registro.nivel <= TRACE:
+            registro.emitir(TRACE, "cliente.camino", cliente=self.id, destino=self.target, camino=list(self.path))
         return self.path
 
 
@@ -173,7 +253,11 @@ class Client:
 
         if self.moving_first_try:
             # Se define el move_delay para el movimiento a la siguiente casilla
-            self.move_delay = calc_move_delay(tipo = self.tipo, rapidez=self.velocidad)
+            if self._step_delays:
+                self.move_delay = self._step_delays.pop()
+            else:
+                rng = self.flujos.movimiento if self.flujos is not None else None
+                self.move_delay = calc_move_delay(tipo = self.tipo, rapidez=self.velocidad, rng=rng)
             self.moving_first_try = False
 
         # control de velocidad por ticks
@@ -194,7 +278,7 @@ class Client:
             return True
         else:
             # si no puede moverse (celda ocupada), intentar re-planificar ocasionalmente
-            if random.random() < 0.2:
+            if self._random() < 0.2:
                 self.plan_path(store_map)
             return False
 
@@ -209,7 +293,8 @@ class Client:
                 if pos == self.pos:
                     # "comprar": eliminar de la lista
                     self.lista.pop(idx)
-                    print(f"[Client {self.id}] bought item at shelf {pos}; items_left={len(self.lista)}")
+                    if registro.nivel <= DEBUG:
+                        registro.emitir(DEBUG, "cliente.compra", cliente=self.id, estante=pos, restantes=len(self.lista))
                     return True
             return False
 
@@ -221,7 +306,8 @@ class Client:
                 for idx, (cat, pid, pos) in enumerate(self.lista):
                     if pos == nb:
                         self.lista.pop(idx)
-                        print(f"[Client {self.id}] bought item from adjacent shelf {nb}; items_left={len(self.lista)}")
+                        if registro.nivel <= DEBUG:
+                            registro.emitir(DEBUG, "cliente.compra", cliente=self.id, estante=nb, restantes=len(self.lista))
                         return True
         return False
 
@@ -250,30 +336,30 @@ class Client:
         # choose target if none
         if self.target is None:
             self.choose_next_target(store_map)
-            print(f"[Client {self.id}] chose target={self.target}")
+            if registro.nivel <= DEBUG:
+                registro.emitir(DEBUG, "cliente.destino", cliente=self.id, destino=self.target)
             self.plan_path(store_map)
 
         # Reevaluación de cajero basada en paciencia
-        # Si va hacia un cajero y no está en fila, considerar cambiar de opinión
-        if self.target and not self.in_queue:
-            target_cell = store_map.get_cell(*self.target)
-            if target_cell and target_cell.type == CellType.CHECKOUT:
-                # Clientes impacientes (patience < 0.5) reevalúan con más frecuencia
-                reevaluate_prob = (1 - self.patience) * 0.3  # Max 30% de prob por tick
-                
-                if random.random() < reevaluate_prob:
-                    new_chk = store_map.find_best_checkout(*self.pos)
-                    
-                    # Solo cambiar si el nuevo cajero es significativamente mejor
-                    if new_chk and new_chk != self.target:
-                        current_load = len(store_map.get_cell(*self.target).queue)
-                        new_load = len(store_map.get_cell(*new_chk).queue)
-                        
-                        # Cambiar si el nuevo tiene al menos 2 personas menos
-                        if new_load < current_load - 1:
-                            self.target = new_chk
-                            self.plan_path(store_map)
-                            print(f"[Client {self.id}] cambió de cajero (paciencia={self.patience:.2f})")
+        # Solo ocurre tras un cambio de cola relevante (ver _on_queue_change)
+        if self._reevaluate_in is not None and self.target and not self.in_queue:
+            self._reevaluate_in -= 1
+            if self._reevaluate_in <= 0:
+                self._reevaluate_in = None
+                new_chk = store_map.find_best_checkout(*self.pos)
+
+                # Solo cambiar si el nuevo cajero es significativamente mejor
+                if new_chk and new_chk != self.target:
+                    current_load = len(store_map.get_cell(*self.target).queue)
+                    new_load = len(store_map.get_cell(*new_chk).queue)
+
+                    # Cambiar si el nuevo tiene al menos 2 personas menos
+                    if new_load < current_load - 1:
+                        self.target = new_chk
+                        self.plan_path(store_map)
+                        if registro.nivel <= DEBUG:
+                            registro.emitir(DEBUG, "cliente.cambio_caja", cliente=self.id, caja=new_chk,
+                                            paciencia=round(self.patience, 2))
 
         # if arrived at target
         if self.target == self.pos:
@@ -287,9 +373,7 @@ class Client:
                     self.path = None
                     if not self.lista:
                         # go to checkout
-                        chk = store_map.find_best_checkout(*self.pos)
-                        self.target = chk
-                        self.plan_path(store_map)
+                        self._head_to_checkout(store_map)
                     return
             # if checkout and in queue handled elsewhere
         # else try move
@@ -303,12 +387,32 @@ class Client:
                     self.target = None
                     self.path = None
                     if not self.lista:
-                        chk = store_map.find_best_checkout(*self.pos)
-                        self.target = chk
-                        self.plan_path(store_map)
+                        self._head_to_checkout(store_map)
                     return
             # if reached checkout cell (queue) `move_client` sets in_queue True
         return
 
     def mark_finished(self):
-        self.shopping_done = True
\ No newline at end of file
+        self.shopping_done = True
+
+
+class ClientPool:
+    """
+    Reserva de instancias de Client reutilizables entre réplicas.
+    acquire() reinicia una instancia libre (o crea una nueva) y release() las devuelve.
+    """
+    def __init__(self):
+        self._free: List[Client] = []
+
+    def acquire(self, patience: float, tipo: str, velocidad: str) -> Client:
+        if self._free:
+            client = self._free.pop()
+            client.reset(patience, tipo, velocidad)
+            return client
+        return Client(patience, tipo, velocidad)
+
+    def release(self, clients: List[Client]):
+        self._free.extend(clients)
+
+    def __len__(self):
+        return len(self._free)
@@ -3,6 +3,11 @@ from entities.client import Client
 from core.simulation import Simulation
 from entities.cell import CellType
 import argparse
+import contextlib
+import json
+import os
+import sys
+from datetime import datetime
 import uvicorn
 
 
@@ -82,14 +87,88 @@ def run_demo():
     sim.run(max_ticks=50, tick_delay=0.1, visualize=True, animate=True, save_animation='store_simulation.gif')
 
 
+def run_batch(scenario_file, replicas=10, workers=None, seed=None, output="resultados_lote.json", fmt=None,
+              use_cache=True, charts=None):
+    """
+    Corre réplicas de un escenario (archivo JSON) sin salida por consola y
+    guarda los KPIs en `output`: JSON con el resumen y cada réplica, o
+    Parquet con una fila por réplica (requiere pyarrow).
+
+    Con semilla, el resultado (y las gráficas si se pide `charts`, un
+    directorio donde copiarlas) sale de la caché de resultados si el mismo
+    escenario ya se corrió con la misma versión del código.
+    """
+    import shutil
+    from core.cache import CacheResultados, clave_escenario
+    from core.escenario import graficas_escenario
+    from core.replicas import ejecutar_replicas, semillas_replicas
+
+    with open(scenario_file, "r", encoding="utf-8") as f:
+        escenario = json.load(f)
+    fmt = fmt or ("parquet" if output.endswith(".parquet") else "json")
+
+    cache = CacheResultados() if use_cache else None
+    clave = clave_escenario(escenario, seed, replicas, graficas=bool(charts)) if cache is not None else None
+    resultado = cache.obtener(clave) if cache is not None else None
+    if resultado is not None:
+        resultado["cache"] = "hit"
+        graficas = os.path.join(cache.ruta(clave), "graficas")
+    else:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            resultado = ejecutar_replicas(escenario, replicas, semilla=seed, workers=workers)
+            graficas = None
+            if charts:
+                graficas = cache.directorio_temporal() if clave is not None else charts
+                graficas_escenario(escenario, semillas_replicas(seed, 1)[0], graficas)
+        entrada = cache.guardar(clave, resultado, graficas=graficas) if clave is not None else None
+        if entrada is not None and charts:
+            graficas = os.path.join(entrada, "graficas")
+        resultado["cache"] = "miss" if clave is not None else None
+    if charts and os.path.abspath(graficas) != os.path.abspath(charts):
+        shutil.copytree(graficas, charts, dirs_exist_ok=True)
+    resultado["ejecutado"] = datetime.now().isoformat(timespec="seconds")
+    resultado["archivo_escenario"] = scenario_file
+
+    directorio = os.path.dirname(output)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    if fmt == "parquet":
+        import pandas as pd
+        filas = []
+        for r in resultado["resultados"]:
+            fila = {f"escenario_{k}": v for k, v in resultado["escenario"].items()}
+            fila.update(r)
+            fila["ejecutado"] = resultado["ejecutado"]
+            filas.append(fila)
+        pd.DataFrame(filas).to_parquet(output, index=False)
+    else:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    return resultado
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run Grocery Store Simulator (server or demo)")
     parser.add_argument('--demo', action='store_true', help='Run local demo simulation instead of starting the server')
     parser.add_argument('--host', default='127.0.0.1', help='Host for server (uvicorn)')
     parser.add_argument('--port', type=int, default=8000, help='Port for server (uvicorn)')
+    parser.add_argument('--batch', metavar='SCENARIO', help='Run replications of a scenario JSON file headless')
+    parser.add_argument('--replicas', type=int, default=10, help='Replications for --batch')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for --batch (default: all cores)')
+    parser.add_argument('--seed', type=int, default=None, help='Master seed for --batch')
+    parser.add_argument('--output', default='resultados_lote.json', help='Results file for --batch (.json or .parquet)')
+    parser.add_argument('--format', choices=['json', 'parquet'], default=None, help='Results format (default: from --output)')
+    parser.add_argument('--charts', metavar='DIR', default=None, help='Save charts of the first replication to DIR for --batch')
+    parser.add_argument('--no-cache', action='store_true', help='Always re-simulate --batch instead of using the result cache')
     args = parser.parse_args()
 
-    if args.demo:
+    if args.batch:
+        try:
+            run_batch(args.batch, args.replicas, args.workers, args.seed, args.output, args.format,
+                      use_cache=not args.no_cache, charts=args.charts)
+        except ImportError as e:
+            sys.exit(f"No se pudo escribir {args.output}: {e}")
+    elif args.demo:
         run_demo()
     else:
         print(f"🚀 Starting server on http://{args.host}:{args.port}")
@@ -23,6 +23,8 @@ let gifCaptureEvery = 3; // capture every N ticks
 let gifMaxFrames = 60; // safety cap
 let currentTick = 0;
 let currentTickDelayMs = 500;
+let simState = null; // estado completo reconstruido a partir de keyframes + deltas
+let runningStatus = '▶️ Simulación en progreso...';
 
 startBtn.addEventListener('click', startSimulation);
 pauseBtn.addEventListener('click', togglePause);
@@ -33,6 +35,7 @@ addClientBtn.addEventListener('click', addClientUI);
 function startSimulation() {
     // reset auto-save flag for a fresh run
     giftSaved = false;
+    runningStatus = '▶️ Simulación en progreso...';
     const config = {
         rows: parseInt(document.getElementById('rows').value),
         cols: parseInt(document.getElementById('cols').value),
@@ -40,8 +43,13 @@ function startSimulation() {
         tick_delay: parseFloat(document.getElementById('tick_delay').value),
         max_ticks: parseInt(document.getElementById('max_ticks').value),
         day: document.getElementById('dia').value,
-        hour: parseInt(document.getElementById('hora').value)
+        hour: parseInt(document.getElementById('hora').value),
+        delta: true,
+        keyframe_every: 50,
+        grabar: document.getElementById('grabar').checked
     };
+    // el formato binario es opcional: las métricas por cliente solo llegan con cada keyframe
+    if (document.getElementById('formato_binario').checked) config.formato = 'binario';
     // attach custom clients if provided
     if (localClients.length > 0) config.clients = localClients;
     console.log("AAAA")
@@ -54,6 +62,7 @@ function startSimulation() {
     ctx = canvas.getContext('2d');
 
     ws = new WebSocket(`ws://${location.host}/ws/simulate`);
+    ws.binaryType = 'arraybuffer';
 
     ws.onopen = () => {
         startBtn.disabled = true;
@@ -99,80 +108,145 @@ function startSimulation() {
         }
     };
 
-    ws.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        // store latest metrics for gift rendering
-        lastClientMetrics = data.client_metrics || null;
-        drawSimulation(data);
-        updateStats(data.stats);
-        renderConsoleMap(data.console_map);
-        // debug: log client_metrics to help diagnose missing times
-        console.debug('client_metrics received:', data.client_metrics);
-        renderClientMetrics(data.client_metrics);
-        renderRawClientMetrics(data.client_metrics);
-    // increment tick counter from server state if available
-    try { currentTick = (data.stats && typeof data.stats.tick === 'number') ? data.stats.tick : currentTick + 1; } catch(e) {}
-        // render charts; if all finished, auto-post the combined PNG to the server once
-        try {
-            renderClientTimesChart(data.client_metrics);
-            renderItemsVsTimeChart(data.client_metrics);
-            const allFinished = (data.client_metrics || []).length > 0 && (data.client_metrics || []).every(c => c.total_time !== null && c.total_time !== undefined);
-            if (allFinished && !giftSaved) {
-                if (saveEnabled) {
-                    try { requestGifSave(); } catch(e) { console.warn('requestGifSave failed', e); }
-                    giftSaved = true;
-                } else {
-                    console.info('saving disabled: not saving gift on allFinished');
-                }
-            }
-            // also respect explicit final flag from server (save snapshot even if not all finished)
-            if (data.final && !giftSaved) {
-                if (saveEnabled) {
-                    try { requestGifSave(); } catch(e) { console.warn('requestGifSave failed (final)', e); }
-                    giftSaved = true;
-                } else {
-                    console.info('saving disabled: not saving gift on final');
-                }
-            }
-        } catch(e){ console.warn('chart render error', e); }
-        // capture a GIF frame periodically
-        try {
-            if (saveEnabled && gifEnabled && gifEncoder && !giftSaved && gifFramesCaptured < gifMaxFrames && (currentTick % gifCaptureEvery) === 0) {
-                const combined = createCombinedCanvas();
-                if (combined) {
-                    try {
-                        gifEncoder.addFrame(combined, { copy: true, delay: currentTickDelayMs });
-                        gifFramesCaptured += 1;
-                    } catch (e) {
-                        console.warn('gif addFrame failed', e);
-                    }
-                }
-            }
-        } catch(e) { /* ignore */ }
+    simState = null;
+    ws.onmessage = handleServerMessage;
+    ws.onclose = handleSocketClose;
+
+    ws.onerror = (error) => {
+        console.error('WebSocket error:', error);
+        statusEl.innerHTML = '❌ Error en la conexión';
     };
+}
 
-    ws.onclose = () => {
-        startBtn.disabled = false;
-        pauseBtn.disabled = true;
-        stepBtn.disabled = true;
-        stopBtn.disabled = true;
-        statusEl.innerHTML = '⏸️ Simulación detenida';
-        statusEl.classList.remove('running');
-        // if the connection closed and we haven't saved the gift yet, try to auto-save current charts
-        if (!giftSaved) {
+// Observar una simulación en curso (sala compartida): solo recibe frames.
+// Con replay=true reproduce una corrida grabada y acepta pausa/paso/detener.
+function watchSimulation(sessionId, replay = false) {
+    giftSaved = true; // un espectador no guarda gifs ni capturas
+    runningStatus = replay ? `⏯️ Reproduciendo la grabación ${sessionId}...` : `👀 Observando la sesión ${sessionId}...`;
+    const canvasContainer = document.getElementById('simulation-canvas');
+    canvasContainer.innerHTML = '';
+    canvas = document.createElement('canvas');
+    canvasContainer.appendChild(canvas);
+    ctx = canvas.getContext('2d');
+
+    const path = replay ? 'replay' : 'watch';
+    ws = new WebSocket(`ws://${location.host}/ws/${path}/${encodeURIComponent(sessionId)}`);
+    ws.binaryType = 'arraybuffer';
+    ws.onopen = () => {
+        startBtn.disabled = true;
+        pauseBtn.disabled = !replay;
+        stepBtn.disabled = !replay;
+        stopBtn.disabled = !replay;
+        statusEl.innerHTML = runningStatus;
+        statusEl.classList.add('running');
+    };
+    simState = null;
+    ws.onmessage = handleServerMessage;
+    ws.onclose = handleSocketClose;
+    ws.onerror = (error) => {
+        console.error('WebSocket error:', error);
+        statusEl.innerHTML = '❌ Error en la conexión';
+    };
+}
+
+function handleServerMessage(event) {
+    if (event.data instanceof ArrayBuffer) {
+        simState = applyBinaryFrame(simState, event.data);
+    } else {
+        const frame = JSON.parse(event.data);
+        // confirmación del formato binario: los frames de grilla llegarán como ArrayBuffer
+        if (frame.frame === 'formato') return;
+        // id de la sala: otros pueden observar con ?watch=<id>
+        if (frame.frame === 'sesion') {
+            console.info(`Compartir: ${location.origin}${location.pathname}?watch=${frame.id}`);
+            if (frame.replay) console.info(`Grabación: ${location.origin}${location.pathname}?replay=${frame.id}`);
+            runningStatus = `▶️ Simulación en progreso... (compartir: ?watch=${frame.id})`;
+            statusEl.innerHTML = runningStatus;
+            return;
+        }
+        if (frame.frame === 'replay') {
+            console.info(`Grabación ${frame.run_id}: ticks ${frame.tick_inicial}-${frame.tick_final}`);
+            return;
+        }
+        if (frame.frame === 'espera') {
+            statusEl.innerHTML = `⏳ En espera (posición ${frame.posicion})...`;
+            return;
+        }
+        if (frame.frame === 'rechazada') {
+            statusEl.innerHTML = `❌ ${frame.error}`;
+            return;
+        }
+        if (simState === null) statusEl.innerHTML = runningStatus;
+        simState = applyFrame(simState, frame);
+    }
+    if (!simState) return;
+    const data = simState;
+    // store latest metrics for gift rendering
+    lastClientMetrics = data.client_metrics || null;
+    drawSimulation(data);
+    updateStats(data.stats);
+    renderConsoleMap(data.console_map);
+    // debug: log client_metrics to help diagnose missing times
+    console.debug('client_metrics received:', data.client_metrics);
+    renderClientMetrics(data.client_metrics);
+    renderRawClientMetrics(data.client_metrics);
+// increment tick counter from server state if available
+try { currentTick = (data.stats && typeof data.stats.tick === 'number') ? data.stats.tick : currentTick + 1; } catch(e) {}
+    // render charts; if all finished, auto-post the combined PNG to the server once
+    try {
+        renderClientTimesChart(data.client_metrics);
+        renderItemsVsTimeChart(data.client_metrics);
+        const allFinished = (data.client_metrics || []).length > 0 && (data.client_metrics || []).every(c => c.total_time !== null && c.total_time !== undefined);
+        if (allFinished && !giftSaved) {
             if (saveEnabled) {
-                try { requestGifSave(); } catch(e) { console.warn('requestGifSave failed (close)', e); }
+                try { requestGifSave(); } catch(e) { console.warn('requestGifSave failed', e); }
                 giftSaved = true;
             } else {
-                console.info('saving disabled: not saving gift on close');
+                console.info('saving disabled: not saving gift on allFinished');
             }
         }
-    };
+        // also respect explicit final flag from server (save snapshot even if not all finished)
+        if (data.final && !giftSaved) {
+            if (saveEnabled) {
+                try { requestGifSave(); } catch(e) { console.warn('requestGifSave failed (final)', e); }
+                giftSaved = true;
+            } else {
+                console.info('saving disabled: not saving gift on final');
+            }
+        }
+    } catch(e){ console.warn('chart render error', e); }
+    // capture a GIF frame periodically
+    try {
+        if (saveEnabled && gifEnabled && gifEncoder && !giftSaved && gifFramesCaptured < gifMaxFrames && (currentTick % gifCaptureEvery) === 0) {
+            const combined = createCombinedCanvas();
+            if (combined) {
+                try {
+                    gifEncoder.addFrame(combined, { copy: true, delay: currentTickDelayMs });
+                    gifFramesCaptured += 1;
+                } catch (e) {
+                    console.warn('gif addFrame failed', e);
+                }
+            }
+        }
+    } catch(e) { /* ignore */ }
+}
 
-    ws.onerror = (error) => {
-        console.error('WebSocket error:', error);
-        statusEl.innerHTML = '❌ Error en la conexión';
-    };
+function handleSocketClose() {
+    startBtn.disabled = false;
+    pauseBtn.disabled = true;
+    stepBtn.disabled = true;
+    stopBtn.disabled = true;
+    statusEl.innerHTML = '⏸️ Simulación detenida';
+    statusEl.classList.remove('running');
+    // if the connection closed and we haven't saved the gift yet, try to auto-save current charts
+    if (!giftSaved) {
+        if (saveEnabled) {
+            try { requestGifSave(); } catch(e) { console.warn('requestGifSave failed (close)', e); }
+            giftSaved = true;
+        } else {
+            console.info('saving disabled: not saving gift on close');
+        }
+    }
 }
 
 // Render leaderboard HTML-like table into a canvas and return the canvas
@@ -653,6 +727,88 @@ function drawSimulation(data) {
     }
 }
 
+// Aplica un frame del servidor sobre el estado actual.
+// Keyframes (o frames sin campo "frame") reemplazan el estado; los deltas
+// traen solo las celdas ("i,j"), métricas (por id) y líneas de consola que cambiaron.
+function applyFrame(state, frame) {
+    if (!frame.frame || frame.frame === 'key' || !state) return frame;
+    if (frame.frame === 'metricas') {
+        state.client_metrics = frame.client_metrics;
+        state.console_map = frame.console_map;
+        return state;
+    }
+    for (const [key, cell] of Object.entries(frame.cells || {})) {
+        const [i, j] = key.split(',').map(Number);
+        state.cells[i][j] = cell;
+    }
+    const metrics = Object.values(frame.client_metrics || {});
+    if (metrics.length > 0) {
+        const index = new Map(state.client_metrics.map((m, k) => [m.id, k]));
+        metrics.forEach(m => {
+            const k = index.get(m.id);
+            if (k === undefined) state.client_metrics.push(m);
+            else state.client_metrics[k] = m;
+        });
+    }
+    const rows = Object.entries(frame.console_rows || {});
+    if (rows.length > 0) {
+        const lines = (state.console_map || '').split('\n');
+        rows.forEach(([i, line]) => { lines[Number(i)] = line; });
+        state.console_map = Array.from(lines, l => l ?? '').join('\n');
+    }
+    state.stats = frame.stats;
+    state.seq = frame.seq;
+    state.descartados = frame.descartados || 0;
+    if (frame.final) state.final = true;
+    return state;
+}
+
+// Frame binario (ver core/frames.py): cabecera de 44 bytes + arreglos tipados
+// con ids/filas/columnas/estado de los agentes y ocupación/cola por celda.
+const BIN_HEADER = 44;
+function applyBinaryFrame(state, buffer) {
+    if (!state) return state; // falta el keyframe con las celdas estáticas
+    const dv = new DataView(buffer);
+    const magic = String.fromCharCode(dv.getUint8(0), dv.getUint8(1), dv.getUint8(2), dv.getUint8(3));
+    if (magic !== 'GSF1' || dv.getUint8(4) !== 2) return state;
+    const flags = dv.getUint8(5);
+    const rows = dv.getUint16(6, true), cols = dv.getUint16(8, true);
+    const dropped = dv.getUint16(10, true); // frames omitidos por el servidor antes de este
+    const n = dv.getUint32(20, true);
+    const u32 = k => dv.getUint32(12 + 4 * k, true);
+    const nCells = rows * cols;
+    let off = BIN_HEADER;
+    const ids = new Uint32Array(buffer, off, n); off += 4 * n;
+    const agentRows = new Uint16Array(buffer, off, n); off += 2 * n;
+    const agentCols = new Uint16Array(buffer, off, n); off += 2 * n;
+    off += 2 * nCells; // largo de cola por celda (redundante con los agentes en cola)
+    const occupancy = new Uint8Array(buffer, off, nCells); off += nCells;
+    const agentState = new Uint8Array(buffer, off, n);
+
+    for (let i = 0; i < rows; i++) {
+        for (let j = 0; j < cols; j++) {
+            const cell = state.cells[i][j];
+            cell.clients = [];
+            cell.queue = [];
+            cell.occupancy = cell.capacity > 0 ? occupancy[i * cols + j] / cell.capacity : 0;
+        }
+    }
+    for (let k = 0; k < n; k++) {
+        const st = agentState[k];
+        const agent = { id: ids[k], tipo: (st & 1) ? 'familia' : 'solo', shopping_done: (st & 4) !== 0 };
+        const cell = state.cells[agentRows[k]][agentCols[k]];
+        if (st & 2) cell.queue.push(agent); else cell.clients.push(agent);
+    }
+    state.stats = {
+        tick: u32(0), total_clients: u32(3), active_clients: u32(4),
+        clients_shopping: u32(5), clients_in_queue: u32(6), clients_done: u32(7)
+    };
+    state.seq = u32(1);
+    state.descartados = dropped;
+    if (flags & 1) state.final = true;
+    return state;
+}
+
 function updateStats(stats) {
     document.getElementById('tick-count').textContent = stats.tick;
     document.getElementById('active-count').textContent = stats.active_clients;
@@ -789,3 +945,7 @@ function togglePause(){ if(!ws) return; ws.send(JSON.stringify({cmd:'pause'}));
 function stepSimulation(){ if(!ws) return; ws.send(JSON.stringify({cmd:'step'})); statusEl.innerText='⏭️ Paso'; }
 function stopSimulation(){ if(ws){ ws.send(JSON.stringify({cmd:'stop'})); ws.close(); } }
 
+// ?watch=<id>: abrir como espectador de una sala; ?replay=<id>: reproducir una grabación
+const urlParams = new URLSearchParams(location.search);
+if (urlParams.get('watch')) watchSimulation(urlParams.get('watch'));
+else if (urlParams.get('replay')) watchSimulation(urlParams.get('replay'), true);